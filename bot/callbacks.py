@@ -0,0 +1,40 @@
+from aiogram.filters.callback_data import CallbackData
+
+# actions that carry a transaction id instead of tier/duration
+_TXN_ACTIONS = frozenset({"check", "cancel"})
+
+
+class PayCB(CallbackData, prefix="pay"):
+    """Payment flow buttons.
+
+    Packs to the same strings the bot used before this schema existed —
+    pay:tier:<tier>, pay:dur|confirm:<tier>:<duration>, pay:check|cancel:<txn_id>
+    — so buttons on messages already sent keep working.
+    """
+
+    action: str                   # tier | dur | confirm | check | cancel
+    tier: str | None = None
+    duration: str | None = None
+    txn_id: str | None = None
+
+    def pack(self) -> str:
+        if self.action in _TXN_ACTIONS:
+            parts = (self.txn_id,)
+        else:
+            parts = (self.tier, self.duration)
+        return self.__separator__.join(
+            [self.__prefix__, self.action, *(p for p in parts if p is not None)]
+        )
+
+    @classmethod
+    def unpack(cls, value: str) -> "PayCB":
+        sep = cls.__separator__
+        prefix, _, rest = value.partition(sep)
+        if prefix != cls.__prefix__:
+            raise ValueError(f"Bad prefix ({prefix!r} != {cls.__prefix__!r})")
+        action, _, rest = rest.partition(sep)
+        # also accept the padded pay:<action>:<tier>:<duration>:<txn_id> layout
+        if action in _TXN_ACTIONS:
+            return cls(action=action, txn_id=rest.lstrip(sep) or None)
+        tier, _, duration = rest.partition(sep)
+        return cls(action=action, tier=tier or None, duration=duration.rstrip(sep) or None)
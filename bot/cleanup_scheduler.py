@@ -10,6 +10,9 @@ Every day at 00:00 WIB:
 Every 6 hours:
   - Check for subscriptions expiring within 24h → send reminder
   - Check for subscriptions expiring within 1h → send urgent reminder
+
+Every minute:
+  - Delete subscriptions whose expiry has passed
 """
 
 import asyncio
@@ -26,6 +29,8 @@ logger = logging.getLogger(__name__)
 
 WIB = datetime.timezone(datetime.timedelta(hours=7))
 
+EXPIRY_SWEEP_INTERVAL = 60  # seconds
+
 # Announcement messages
 MAINT_START_MSG = (
     "🔧 <b>Maintenance Dimulai</b>\n\n"
@@ -45,21 +50,25 @@ class MidnightCleaner:
     def __init__(self):
         self._task: Optional[asyncio.Task] = None
         self._reminder_task: Optional[asyncio.Task] = None
+        self._expiry_task: Optional[asyncio.Task] = None
         self._bot: Optional[Bot] = None
-        self._admin_ids: list[int] = []
+        self._admin_ids: tuple[int, ...] = ()
 
-    def start(self, bot: Bot, admin_ids: list[int]) -> None:
+    def start(self, bot: Bot, admin_ids: tuple[int, ...]) -> None:
         self._bot = bot
         self._admin_ids = admin_ids
         self._task = asyncio.create_task(self._loop())
         self._reminder_task = asyncio.create_task(self._reminder_loop())
-        logger.info("[MidnightCleaner] Scheduler started (WIB midnight cleanup + reminders)")
+        self._expiry_task = asyncio.create_task(self._expiry_loop())
+        logger.info("[MidnightCleaner] Scheduler started (WIB midnight cleanup + reminders + expiry sweep)")
 
     def stop(self) -> None:
         if self._task and not self._task.done():
             self._task.cancel()
         if self._reminder_task and not self._reminder_task.done():
             self._reminder_task.cancel()
+        if self._expiry_task and not self._expiry_task.done():
+            self._expiry_task.cancel()
         logger.info("[MidnightCleaner] Scheduler stopped")
 
     async def _loop(self) -> None:
@@ -142,6 +151,23 @@ class MidnightCleaner:
         await self._do_cleanup()
         return "Cleanup complete"
 
+    # ------------------------------------------------------------------
+    # Expired subscription sweep (every minute)
+    # ------------------------------------------------------------------
+
+    async def _expiry_loop(self) -> None:
+        try:
+            while True:
+                try:
+                    purged = await db.purge_expired_subscriptions()
+                    if purged:
+                        logger.info("[ExpirySweep] Removed %d expired subscriptions", purged)
+                except Exception:
+                    logger.exception("[ExpirySweep] Error in expiry sweep")
+                await asyncio.sleep(EXPIRY_SWEEP_INTERVAL)
+        except asyncio.CancelledError:
+            pass
+
     # ------------------------------------------------------------------
     # Subscription expiry reminder loop (every 6 hours)
     # ------------------------------------------------------------------
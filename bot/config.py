@@ -1,5 +1,6 @@
+from functools import cached_property
 from pathlib import Path
-from typing import List
+from typing import Tuple
 
 from pydantic import AliasChoices, Field
 from pydantic_settings import BaseSettings
@@ -31,6 +32,7 @@ class BotSettings(BaseSettings):
     QRIS_BASE_URL: str = "https://qris.hubify.store/api"
     QRIS_POLL_INTERVAL: int = 10     # seconds between status checks
     QRIS_POLL_TIMEOUT: int = 900     # 15 minutes max polling
+    MAX_CONCURRENT_POLLS: int = 200  # cap on payments tracked by the poller at once
 
     # --- MongoDB ---
     MONGODB_URI: str = Field(
@@ -50,8 +52,9 @@ class BotSettings(BaseSettings):
         env_file_encoding = "utf-8"
         extra = "ignore"
 
-    @property
-    def admin_ids(self) -> List[int]:
+    @cached_property
+    def admin_ids(self) -> Tuple[int, ...]:
+        # Parsed on first use; BOT_ADMIN_IDS only changes on restart.
         normalized = self.BOT_ADMIN_IDS.replace(";", ",").replace(" ", ",")
         values = []
         for chunk in normalized.split(","):
@@ -62,7 +65,7 @@ class BotSettings(BaseSettings):
                 values.append(int(chunk))
             except ValueError:
                 continue
-        return values
+        return tuple(values)
 
     @property
     def gateway_api_key(self) -> str:
@@ -11,12 +11,15 @@ Collections:
   reminders_sent – tracks expiry reminders already sent
 """
 
+import asyncio
 import logging
 import time
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 
 from .config import settings
 
@@ -62,6 +65,7 @@ async def _ensure_indexes(db: AsyncIOMotorDatabase) -> None:
     """Create indexes for all collections."""
     await db.users.create_index("user_id", unique=True)
     await db.subscriptions.create_index("user_id", unique=True)
+    await db.subscriptions.create_index("expires")
     await db.daily_usage.create_index([("user_id", 1), ("date_key", 1)], unique=True)
     await db.daily_usage.create_index("date_key")
     await db.payments.create_index([("user_id", 1), ("status", 1)])
@@ -233,19 +237,68 @@ async def upsert_subscription(
     )
 
 
+async def grant_subscription(
+    user_id: int,
+    tier: str,
+    duration_seconds: float,
+    granted_by: int = 0,
+    now: float = 0,
+) -> float:
+    """Grant or extend a subscription in one round-trip; returns the new expiry.
+
+    An active subscription of the same tier is extended from its current
+    expiry, anything else starts from ``now``. The decision is made in the
+    update pipeline, so two concurrent grants both count.
+    """
+    db = await get_db()
+    now = now or time.time()
+    still_active = {"$and": [{"$eq": ["$tier", tier]}, {"$gt": ["$expires", now]}]}
+    doc = await db.subscriptions.find_one_and_update(
+        {"user_id": user_id},
+        [
+            {
+                "$set": {
+                    "user_id": user_id,
+                    "tier": tier,
+                    "expires": {"$add": [{"$cond": [still_active, "$expires", now]}, duration_seconds]},
+                    "granted_by": granted_by,
+                    "granted_at": now,
+                },
+            },
+        ],
+        projection={"_id": 0, "expires": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return doc["expires"]
+
+
 async def delete_subscription(user_id: int) -> bool:
     db = await get_db()
     result = await db.subscriptions.delete_one({"user_id": user_id})
     return result.deleted_count > 0
 
 
-async def list_active_subscriptions() -> List[Dict[str, Any]]:
+async def purge_expired_subscriptions() -> int:
+    """Delete every lapsed paid subscription in one query (uses the expires index)."""
+    db = await get_db()
+    result = await db.subscriptions.delete_many({"expires": {"$gt": 0, "$lt": time.time()}})
+    return result.deleted_count
+
+
+def _active_subscription_filter() -> Dict[str, Any]:
+    return {"$or": [{"expires": {"$gt": time.time()}}, {"expires": 0}]}
+
+
+async def list_active_subscriptions(limit: int = 0, offset: int = 0) -> List[Dict[str, Any]]:
+    """Active subscriptions ordered by user_id; ``limit=0`` means all."""
     db = await get_db()
-    now = time.time()
     rows = []
-    cursor = db.subscriptions.find(
-        {"$or": [{"expires": {"$gt": now}}, {"expires": 0}]},
-        {"_id": 0},
+    cursor = (
+        db.subscriptions.find(_active_subscription_filter(), {"_id": 0})
+        .sort("user_id", 1)
+        .skip(offset)
+        .limit(limit)
     )
     async for doc in cursor:
         rows.append({
@@ -258,6 +311,11 @@ async def list_active_subscriptions() -> List[Dict[str, Any]]:
     return rows
 
 
+async def count_active_subscriptions() -> int:
+    db = await get_db()
+    return await db.subscriptions.count_documents(_active_subscription_filter())
+
+
 # ---------------------------------------------------------------------------
 # Payments
 # ---------------------------------------------------------------------------
@@ -347,36 +405,55 @@ async def mark_trial_used(user_id: int) -> None:
     )
 
 
-async def set_referred_by(user_id: int, referrer_id: int) -> None:
-    db = await get_db()
-    await db.users.update_one(
-        {"user_id": user_id},
-        {"$set": {"referred_by": referrer_id}},
-    )
-
+async def apply_referral(referrer_id: int, referred_id: int, bonus_images: int) -> bool:
+    """Record a referral and credit both users' bonus.
 
-async def create_referral(referrer_id: int, referred_id: int) -> bool:
-    """Record a referral. Returns True if successfully created (not duplicate)."""
+    The insert on the unique ``referred_id`` index is the guard: a duplicate
+    referral fails there and nothing else is written.  The remaining writes
+    run one after another and ``bonus_given`` is only set after both credits
+    have landed; if any step fails it is logged with both ids (and which
+    step) before the error propagates, so a partial credit can be fixed up.
+    Returns True if the referral was new and applied.
+    """
     db = await get_db()
-    now = time.time()
     try:
         await db.referrals.insert_one({
             "referrer_id": referrer_id,
             "referred_id": referred_id,
             "bonus_given": 0,
-            "created_at": now,
+            "created_at": time.time(),
         })
-        return True
-    except Exception:
+    except DuplicateKeyError:
         return False
 
-
-async def mark_referral_bonus(referred_id: int) -> None:
-    db = await get_db()
-    await db.referrals.update_one(
-        {"referred_id": referred_id},
-        {"$set": {"bonus_given": 1}},
-    )
+    step = "referred_by"
+    try:
+        await db.users.update_one(
+            {"user_id": referred_id},
+            {"$set": {"referred_by": referrer_id}},
+        )
+        for uid in (referrer_id, referred_id):
+            step = f"credit {uid}"
+            await db.extra_quota.update_one(
+                {"user_id": uid},
+                {
+                    "$inc": {"images": bonus_images, "videos": 0},
+                    "$setOnInsert": {"user_id": uid},
+                },
+                upsert=True,
+            )
+        step = "bonus_given"
+        await db.referrals.update_one(
+            {"referred_id": referred_id},
+            {"$set": {"bonus_given": 1}},
+        )
+    except Exception:
+        logger.error(
+            "[Referral] %s -> %s failed at %s (bonus %d); earlier steps were applied",
+            referrer_id, referred_id, step, bonus_images,
+        )
+        raise
+    return True
 
 
 async def count_referrals(referrer_id: int) -> int:
@@ -406,29 +483,33 @@ async def get_extra_quota(user_id: int) -> Dict[str, int]:
 
 
 async def add_extra_quota(user_id: int, images: int = 0, videos: int = 0) -> Dict[str, int]:
+    """Add extra quota and return the new balance in the same round-trip."""
     db = await get_db()
-    await db.extra_quota.update_one(
+    doc = await db.extra_quota.find_one_and_update(
         {"user_id": user_id},
         {
             "$inc": {"images": images, "videos": videos},
             "$setOnInsert": {"user_id": user_id},
         },
+        projection={"_id": 0, "images": 1, "videos": 1},
         upsert=True,
+        return_document=ReturnDocument.AFTER,
     )
-    return await get_extra_quota(user_id)
+    return {"images": doc.get("images", 0), "videos": doc.get("videos", 0)}
 
 
 async def deduct_extra_quota(user_id: int, images: int = 0, videos: int = 0) -> bool:
-    """Deduct from extra quota. Returns True if sufficient quota available."""
+    """Deduct from extra quota. Returns True if sufficient quota available.
+
+    The balance check is part of the update filter, so concurrent deductions
+    can't take the balance below zero.
+    """
     db = await get_db()
-    quota = await get_extra_quota(user_id)
-    if quota["images"] < images or quota["videos"] < videos:
-        return False
-    await db.extra_quota.update_one(
-        {"user_id": user_id},
+    result = await db.extra_quota.update_one(
+        {"user_id": user_id, "images": {"$gte": images}, "videos": {"$gte": videos}},
         {"$inc": {"images": -images, "videos": -videos}},
     )
-    return True
+    return result.modified_count > 0
 
 
 # ---------------------------------------------------------------------------
@@ -583,6 +664,32 @@ async def get_usage(user_id: int) -> Dict[str, int]:
     return {"images": doc.get("images", 0), "videos": doc.get("videos", 0)}
 
 
+async def get_quota_snapshot(user_id: int) -> Dict[str, int]:
+    """Today's usage and the extra-quota balance, fetched concurrently.
+
+    Keys: images, videos, extra_images, extra_videos (missing rows count as 0).
+    """
+    db = await get_db()
+    usage, extra = await asyncio.gather(
+        db.daily_usage.find_one(
+            {"user_id": user_id, "date_key": _today_key()},
+            {"_id": 0, "images": 1, "videos": 1},
+        ),
+        db.extra_quota.find_one(
+            {"user_id": user_id},
+            {"_id": 0, "images": 1, "videos": 1},
+        ),
+    )
+    usage = usage or {}
+    extra = extra or {}
+    return {
+        "images": usage.get("images", 0),
+        "videos": usage.get("videos", 0),
+        "extra_images": extra.get("images", 0),
+        "extra_videos": extra.get("videos", 0),
+    }
+
+
 async def add_usage(user_id: int, images: int = 0, videos: int = 0) -> Dict[str, int]:
     db = await get_db()
     date_key = _today_key()
@@ -597,6 +704,32 @@ async def add_usage(user_id: int, images: int = 0, videos: int = 0) -> Dict[str,
     return await get_usage(user_id)
 
 
+async def try_add_usage(user_id: int, field: str, units: int, limit: int) -> bool:
+    """Add ``units`` to today's ``field`` ("images"/"videos") only if it stays within ``limit``.
+
+    Single atomic update: when today's row exists but is over the limit the
+    filter misses, the upsert collides with the unique (user_id, date_key)
+    index and we report False.
+    """
+    if units > limit:
+        return False
+    db = await get_db()
+    date_key = _today_key()
+    try:
+        await db.daily_usage.update_one(
+            {
+                "user_id": user_id,
+                "date_key": date_key,
+                "$or": [{field: {"$lte": limit - units}}, {field: {"$exists": False}}],
+            },
+            {"$inc": {field: units}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        return False
+    return True
+
+
 async def reset_all_daily_usage() -> int:
     """Delete all daily_usage documents. Returns count deleted."""
     db = await get_db()
@@ -27,12 +27,12 @@ class GeminiHealthScheduler:
     def __init__(self):
         self._task: Optional[asyncio.Task] = None
         self._bot: Optional[Bot] = None
-        self._admin_ids: list[int] = []
+        self._admin_ids: tuple[int, ...] = ()
         self._gemini_mgr = None  # set on start
         self._prev_statuses: dict[int, str] = {}
         self._login_in_progress: set[int] = set()  # indices currently being refreshed
 
-    def start(self, bot: Bot, admin_ids: list[int], gemini_mgr) -> None:
+    def start(self, bot: Bot, admin_ids: tuple[int, ...], gemini_mgr) -> None:
         self._bot = bot
         self._admin_ids = admin_ids
         self._gemini_mgr = gemini_mgr
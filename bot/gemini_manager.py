@@ -6,6 +6,7 @@ for the bot UI (active / dead / unknown).
 """
 
 import json
+import os
 import uuid
 from pathlib import Path
 from typing import Any, Dict, List, Optional
@@ -40,6 +41,12 @@ class LocalGeminiManager:
             self.file_path.parent.mkdir(parents=True, exist_ok=True)
             self.file_path.write_text("[]", encoding="utf-8")
 
+    def _save_accounts(self, accounts: List[dict]) -> None:
+        """Write via a temp file + rename so a crash never leaves half a file."""
+        tmp = self.file_path.with_name(self.file_path.name + ".tmp")
+        tmp.write_text(json.dumps(accounts, separators=(",", ":")), encoding="utf-8")
+        os.replace(tmp, self.file_path)
+
     def list_accounts(self) -> List[dict]:
         self._ensure_file()
         try:
@@ -83,7 +90,7 @@ class LocalGeminiManager:
             "mail_provider": mail_provider,
         }
         accounts.append(new_account)
-        self.file_path.write_text(json.dumps(accounts), encoding="utf-8")
+        self._save_accounts(accounts)
 
         # Default new account status
         self._status[before_count] = STATUS_UNKNOWN
@@ -104,7 +111,7 @@ class LocalGeminiManager:
             return {"status": "error", "message": f"Index {index + 1} tidak valid (total: {len(accounts)})"}
 
         removed = accounts.pop(index)
-        self.file_path.write_text(json.dumps(accounts), encoding="utf-8")
+        self._save_accounts(accounts)
 
         # Re-index status cache
         new_status = {}
@@ -143,7 +150,7 @@ class LocalGeminiManager:
             return {"status": "error", "message": f"Index {index + 1} tidak valid"}
         accounts[index]["email"] = email
         accounts[index]["mail_provider"] = mail_provider
-        self.file_path.write_text(json.dumps(accounts), encoding="utf-8")
+        self._save_accounts(accounts)
         return {"status": "ok", "message": f"Server {index + 1} email set: {email}"}
 
     def update_account_cookies(self, index: int, new_config: dict) -> Dict[str, str]:
@@ -154,7 +161,7 @@ class LocalGeminiManager:
         for key in ("secure_c_ses", "host_c_oses", "csesidx", "config_id", "expires_at"):
             if key in new_config and new_config[key]:
                 accounts[index][key] = new_config[key]
-        self.file_path.write_text(json.dumps(accounts), encoding="utf-8")
+        self._save_accounts(accounts)
         return {"status": "ok", "message": f"Server {index + 1} cookies updated"}
 
     def get_account(self, index: int) -> Optional[dict]:
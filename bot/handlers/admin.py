@@ -54,7 +54,7 @@ async def _show_image_list(callback: CallbackQuery, state: FSMContext, start: in
     await safe_edit_text(
         callback.message,
         "\n\n".join(lines),
-        reply_markup=media_page_keyboard("images", start, end, len(images)),
+        reply_markup=media_page_keyboard("images", start, end, len(images), PAGE_SIZE),
     )
 
 
@@ -75,7 +75,7 @@ async def _show_video_list(callback: CallbackQuery, state: FSMContext, start: in
     await safe_edit_text(
         callback.message,
         "\n\n".join(lines),
-        reply_markup=media_page_keyboard("videos", start, end, len(videos)),
+        reply_markup=media_page_keyboard("videos", start, end, len(videos), PAGE_SIZE),
     )
 
 
@@ -85,7 +85,8 @@ async def open_admin_menu(callback: CallbackQuery) -> None:
         await callback.answer("Akses admin ditolak", show_alert=True)
         return
 
-    await callback.message.edit_text(
+    await safe_edit_text(
+        callback.message,
         "<b>Admin Panel</b>",
         reply_markup=admin_menu_keyboard(),
     )
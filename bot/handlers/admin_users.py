@@ -39,10 +39,13 @@ from ..subscription_manager import (
     Duration,
     Tier,
     TIER_LABELS,
+    TIER_LABELS_BY_VALUE,
+    TIER_VALUES,
     DURATION_LABELS,
     subscription_manager,
 )
 from ..ui import clear_state, safe_edit_text
+from ..user_limit_manager import user_limit_manager
 
 logger = logging.getLogger(__name__)
 
@@ -203,7 +206,7 @@ async def _build_user_detail(user: dict) -> str:
     last_seen = datetime.fromtimestamp(user["last_seen"]).strftime("%d/%m/%Y %H:%M") if user["last_seen"] else "-"
 
     sub = await subscription_manager.get_subscription(uid)
-    tier = Tier(sub.tier) if sub.tier in [t.value for t in Tier] else Tier.FREE
+    tier = Tier(sub.tier) if sub.tier in TIER_VALUES else Tier.FREE
     tier_label = TIER_LABELS[tier]
 
     lines = [
@@ -260,7 +263,7 @@ async def adm_subscribers(callback: CallbackQuery) -> None:
 
     lines = [f"<b>Subscriber Aktif</b> · {len(subs)}\n"]
     for s in subs:
-        tier_label = TIER_LABELS.get(Tier(s["tier"]), s["tier"])
+        tier_label = TIER_LABELS_BY_VALUE.get(s["tier"], s["tier"])
         exp = datetime.fromtimestamp(s["expires"]).strftime("%d/%m %H:%M") if s["expires"] else "∞"
         user = await db.get_user(s["user_id"])
         name = html.escape(user["first_name"]) if user and user["first_name"] else str(s["user_id"])
@@ -418,6 +421,8 @@ async def adm_user_del_ok(callback: CallbackQuery) -> None:
         return
 
     await db.delete_user(uid)
+    subscription_manager.invalidate(uid)
+    user_limit_manager.invalidate(uid)
     await safe_edit_text(
         callback.message,
         f"User <code>{uid}</code> dihapus.",
@@ -13,6 +13,7 @@ from ..subscription_manager import (
     DURATION_LABELS,
     TIER_LABELS,
     TIER_LIMITS,
+    TIER_VALUES,
     UNLIMITED,
     Tier,
     subscription_manager,
@@ -79,6 +80,7 @@ async def cmd_start(message: Message, state: FSMContext, command: CommandObject
                 granted_at=time.time(),
             )
             await db.mark_trial_used(user_id)
+            subscription_manager.invalidate(user_id)
             extra_messages.append(
                 "🎁 <b>Selamat Datang!</b>\n\n"
                 "Kamu mendapat <b>💎 Premium Trial 12 Jam</b> gratis.\n\n"
@@ -90,7 +92,7 @@ async def cmd_start(message: Message, state: FSMContext, command: CommandObject
 
     # Subscription info
     sub = await subscription_manager.get_subscription(user_id)
-    tier = Tier(sub.tier) if sub.tier in [t.value for t in Tier] else Tier.FREE
+    tier = Tier(sub.tier) if sub.tier in TIER_VALUES else Tier.FREE
     tier_label = TIER_LABELS[tier]
     limits = TIER_LIMITS[tier]
 
@@ -278,7 +280,7 @@ async def open_backend_menu(callback: CallbackQuery, state: FSMContext) -> None:
 
 @router.callback_query(F.data.startswith("backend:"))
 async def set_backend(callback: CallbackQuery, state: FSMContext) -> None:
-    new_backend = callback.data.replace("backend:", "", 1)
+    new_backend = callback.data.removeprefix("backend:")
     data = await state.get_data()
     current = data.get("backend", "grok")
 
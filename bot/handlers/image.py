@@ -1,5 +1,8 @@
+import re
+from functools import lru_cache
+from itertools import islice
 from pathlib import Path
-from urllib.parse import unquote, urlparse
+from urllib.parse import unquote, urlsplit
 
 from aiogram import F, Router
 from aiogram.fsm.context import FSMContext
@@ -11,7 +14,7 @@ from ..rate_limiter import check_cooldown, record_request
 from ..security import is_admin
 from ..states import ImageFlow
 from ..subscription_manager import subscription_manager
-from ..ui import clear_state, get_backend, safe_edit_text
+from ..ui import clear_state, get_backend, register_state_mirror, safe_edit_text
 from ..user_limit_manager import user_limit_manager
 from .common import HOME_TEXT
 
@@ -25,13 +28,21 @@ BACKEND_IMAGE_MODEL = {
     "gemini": "gemini-imagen",
 }
 
+# Last segment of a URL path (trailing slashes ignored, like Path.name).
+_FILENAME_RE = re.compile(r"([^/]+)/*$")
+
 
 def _resolve_local_image_path(url: str) -> Path | None:
     try:
-        parsed = urlparse(url)
-        filename = Path(unquote(parsed.path)).name
-    except Exception:
+        path = urlsplit(url).path
+    except ValueError:
+        return None
+    match = _FILENAME_RE.search(path)
+    if not match:
         return None
+    filename = match.group(1)
+    if "%" in filename:
+        filename = Path(unquote(filename)).name
     if not filename:
         return None
     file_path = IMAGES_DIR / filename
@@ -40,27 +51,44 @@ def _resolve_local_image_path(url: str) -> Path | None:
     return None
 
 
+_IMAGE_SETTINGS_TMPL = (
+    "<b>🖼 Buat Gambar</b>\n"
+    "Rasio <b>%s</b> · Jumlah <b>%d</b>%s\n\n"
+    "Atur rasio dan jumlah gambar di bawah,\n"
+    "lalu tekan <b>✏️ Tulis Prompt</b> dan ketik deskripsi gambar.\n"
+    "<i>Contoh: kucing lucu memakai topi astronot</i>"
+)
+
+
+@lru_cache(maxsize=128)
 def _image_settings_text(aspect: str, n: int, max_batch: int = 1) -> str:
-    batch_line = ""
     if max_batch > 1:
-        batch_line = f" · Batch max <b>{max_batch}</b>"
-    return (
-        "<b>🖼 Buat Gambar</b>\n"
-        f"Rasio <b>{aspect}</b> · Jumlah <b>{n}</b>{batch_line}\n\n"
-        "Atur rasio dan jumlah gambar di bawah,\n"
-        "lalu tekan <b>✏️ Tulis Prompt</b> dan ketik deskripsi gambar.\n"
-        "<i>Contoh: kucing lucu memakai topi astronot</i>"
-    )
+        return _IMAGE_SETTINGS_TMPL % (aspect, n, " · Batch max <b>%d</b>" % max_batch)
+    return _IMAGE_SETTINGS_TMPL % (aspect, n, "")
+
+
+# (aspect, n) per FSM key, so repeat lookups skip the storage round-trip
+_defaults_mirror: dict = register_state_mirror({})
 
 
 async def _ensure_image_defaults(state: FSMContext) -> tuple[str, int]:
+    cached = _defaults_mirror.get(state.key)
+    if cached is not None:
+        return cached
     data = await state.get_data()
     aspect = data.get("img_aspect", "1:1")
     n = data.get("img_n", 1)
-    await state.update_data(img_aspect=aspect, img_n=n)
+    if "img_aspect" not in data or "img_n" not in data:
+        await state.update_data(img_aspect=aspect, img_n=n)
+    _defaults_mirror[state.key] = (aspect, n)
     return aspect, n
 
 
+async def _set_image_defaults(state: FSMContext, aspect: str, n: int) -> None:
+    await state.update_data(img_aspect=aspect, img_n=n)
+    _defaults_mirror[state.key] = (aspect, n)
+
+
 @router.callback_query(F.data == "menu:image")
 async def open_image_menu(callback: CallbackQuery, state: FSMContext) -> None:
     await clear_state(state)
@@ -103,7 +131,7 @@ async def open_image_menu(callback: CallbackQuery, state: FSMContext) -> None:
     # clamp n to tier max
     if n > tier_limits.max_images_per_request:
         n = tier_limits.max_images_per_request
-        await state.update_data(img_n=n)
+        await _set_image_defaults(state, aspect, n)
     await safe_edit_text(
         callback.message,
         _image_settings_text(aspect, n, tier_limits.max_batch_prompts),
@@ -114,13 +142,12 @@ async def open_image_menu(callback: CallbackQuery, state: FSMContext) -> None:
 
 @router.callback_query(F.data.startswith("img:aspect:"))
 async def set_image_aspect(callback: CallbackQuery, state: FSMContext) -> None:
-    aspect = callback.data.replace("img:aspect:", "", 1)
-    current_aspect, _ = await _ensure_image_defaults(state)
+    aspect = callback.data.removeprefix("img:aspect:")
+    current_aspect, n = await _ensure_image_defaults(state)
     if current_aspect == aspect:
         await callback.answer("Aspect ratio sudah aktif")
         return
-    await state.update_data(img_aspect=aspect)
-    _, n = await _ensure_image_defaults(state)
+    await _set_image_defaults(state, aspect, n)
     user_id = callback.from_user.id if callback.from_user else 0
     tier_limits = await subscription_manager.get_limits(user_id)
     await safe_edit_text(
@@ -133,7 +160,7 @@ async def set_image_aspect(callback: CallbackQuery, state: FSMContext) -> None:
 
 @router.callback_query(F.data.startswith("img:n:"))
 async def set_image_count(callback: CallbackQuery, state: FSMContext) -> None:
-    n = int(callback.data.replace("img:n:", "", 1))
+    n = int(callback.data.removeprefix("img:n:"))
     aspect, current_n = await _ensure_image_defaults(state)
     user_id = callback.from_user.id if callback.from_user else 0
     tier_limits = await subscription_manager.get_limits(user_id)
@@ -143,7 +170,7 @@ async def set_image_count(callback: CallbackQuery, state: FSMContext) -> None:
     if current_n == n:
         await callback.answer("Jumlah gambar sudah aktif")
         return
-    await state.update_data(img_n=n)
+    await _set_image_defaults(state, aspect, n)
     await safe_edit_text(
         callback.message,
         _image_settings_text(aspect, n, tier_limits.max_batch_prompts),
@@ -322,7 +349,7 @@ async def handle_image_prompt(message: Message, state: FSMContext) -> None:
         await message.answer(
             f"Limit image habis. Sisa: {status['images_remaining']}"
         )
-        await message.answer(HOME_TEXT, reply_markup=main_menu_keyboard(await get_backend(state)))
+        await message.answer(HOME_TEXT, reply_markup=main_menu_keyboard(backend))
         return
 
     model = BACKEND_IMAGE_MODEL.get(backend, "grok-2-image")
@@ -332,7 +359,7 @@ async def handle_image_prompt(message: Message, state: FSMContext) -> None:
         record_request(user_id)
 
     await clear_state(state)
-    await message.answer(HOME_TEXT, reply_markup=main_menu_keyboard(await get_backend(state)))
+    await message.answer(HOME_TEXT, reply_markup=main_menu_keyboard(backend))
 
 
 @router.message(ImageFlow.waiting_batch_prompts)
@@ -345,15 +372,17 @@ async def handle_batch_prompts(message: Message, state: FSMContext) -> None:
     user_id = message.from_user.id if message.from_user else 0
     admin_user = is_admin(user_id)
     tier_limits = await subscription_manager.get_limits(user_id)
+    backend = await get_backend(state)
     aspect, n = await _ensure_image_defaults(state)
 
-    # Parse prompts (one per line)
-    prompts = [line.strip() for line in raw.splitlines() if line.strip()]
+    # Parse prompts (one per line); materialize at most one past the limit
+    max_batch = tier_limits.max_batch_prompts
+    stripped = (line.strip() for line in raw.splitlines())
+    prompts = list(islice(filter(None, stripped), max_batch + 1))
     if not prompts:
         await message.answer("Prompt tidak boleh kosong. Kirim ulang.")
         return
 
-    max_batch = tier_limits.max_batch_prompts
     if len(prompts) > max_batch:
         await message.answer(
             f"Max {max_batch} prompt — hanya {max_batch} pertama diproses."
@@ -371,7 +400,7 @@ async def handle_batch_prompts(message: Message, state: FSMContext) -> None:
         if can_do <= 0:
             await clear_state(state)
             await message.answer(f"Limit image habis. Sisa: {remaining}")
-            await message.answer(HOME_TEXT, reply_markup=main_menu_keyboard(await get_backend(state)))
+            await message.answer(HOME_TEXT, reply_markup=main_menu_keyboard(backend))
             return
         await message.answer(
             f"Limit cukup untuk {can_do} prompt saja (sisa: {remaining})."
@@ -380,8 +409,6 @@ async def handle_batch_prompts(message: Message, state: FSMContext) -> None:
 
     await message.answer(f"Batch generate: <b>{len(prompts)}</b> prompt × <b>{n}</b> gambar…")
 
-    data = await state.get_data()
-    backend = data.get("backend", "grok")
     model = BACKEND_IMAGE_MODEL.get(backend, "grok-2-image")
 
     total_sent = 0
@@ -399,4 +426,4 @@ async def handle_batch_prompts(message: Message, state: FSMContext) -> None:
     if total_sent > 0:
         record_request(user_id)
     await clear_state(state)
-    await message.answer(HOME_TEXT, reply_markup=main_menu_keyboard(await get_backend(state)))
+    await message.answer(HOME_TEXT, reply_markup=main_menu_keyboard(backend))
@@ -15,7 +15,10 @@ router = Router()
 
 WIB = datetime.timezone(datetime.timedelta(hours=7))
 
-MEDALS = ["🥇", "🥈", "🥉", "4️⃣", "5️⃣", "6️⃣", "7️⃣", "8️⃣", "9️⃣", "🔟"]
+# One medal per leaderboard slot; extend together with LEADERBOARD_LIMIT.
+MEDALS = ("🥇", "🥈", "🥉", "4️⃣", "5️⃣", "6️⃣", "7️⃣", "8️⃣", "9️⃣", "🔟")
+LEADERBOARD_LIMIT = len(MEDALS)
+_ENTRY_INDENT = "     "
 
 
 @router.callback_query(F.data == "menu:leaderboard")
@@ -23,7 +26,7 @@ async def show_leaderboard(callback: CallbackQuery) -> None:
     now = datetime.datetime.now(WIB)
     month_label = now.strftime("%B %Y")
 
-    top = await db.get_leaderboard(limit=10)
+    top = await db.get_leaderboard(limit=LEADERBOARD_LIMIT)
     user_id = callback.from_user.id
 
     if not top:
@@ -37,38 +40,36 @@ async def show_leaderboard(callback: CallbackQuery) -> None:
         await callback.answer()
         return
 
-    lines = [f"<b>🏆 Ranking — {month_label}</b>"]
-    lines.append("<i>User paling aktif bulan ini</i>\n")
-
-    for i, entry in enumerate(top):
-        medal = MEDALS[i] if i < len(MEDALS) else f"{i+1}."
-        name = entry.get("first_name") or entry.get("username") or str(entry["user_id"])
-        total_img = entry.get("total_images", 0)
-        total_vid = entry.get("total_videos", 0)
-        total = entry.get("total", 0)
-        is_me = " ◀" if entry["user_id"] == user_id else ""
-        lines.append(
-            f"{medal} <b>{name}</b>{is_me}\n"
-            f"     {total_img} img · {total_vid} vid · {total} total"
-        )
+    body = [
+        f"{MEDALS[i]} <b>{_entry_name(entry)}</b>{' ◀' if entry['user_id'] == user_id else ''}\n"
+        f"{_ENTRY_INDENT}{entry.get('total_images', 0)} img · "
+        f"{entry.get('total_videos', 0)} vid · {entry.get('total', 0)} total"
+        for i, entry in enumerate(top)
+    ]
 
     # Find user's own rank
-    user_rank = None
-    for i, entry in enumerate(top):
-        if entry["user_id"] == user_id:
-            user_rank = i + 1
-            break
+    user_rank = next(
+        (i + 1 for i, entry in enumerate(top) if entry["user_id"] == user_id),
+        None,
+    )
 
     if user_rank:
-        lines.append(f"\nPeringkat kamu: <b>#{user_rank}</b> 🎉")
+        footer = f"\nPeringkat kamu: <b>#{user_rank}</b> 🎉"
     else:
         # Get user's own usage
         usage = await db.get_usage(user_id)
         total_own = usage["images"] + usage["videos"]
         if total_own > 0:
-            lines.append(f"\nKamu belum masuk top 10. Total bulan ini: {total_own}")
+            footer = f"\nKamu belum masuk top {LEADERBOARD_LIMIT}. Total bulan ini: {total_own}"
         else:
-            lines.append("\nGenerate gambar/video untuk masuk ranking!")
+            footer = "\nGenerate gambar/video untuk masuk ranking!"
+
+    lines = [
+        f"<b>🏆 Ranking — {month_label}</b>",
+        "<i>User paling aktif bulan ini</i>\n",
+        *body,
+        footer,
+    ]
 
     await safe_edit_text(
         callback.message,
@@ -78,6 +79,10 @@ async def show_leaderboard(callback: CallbackQuery) -> None:
     await callback.answer()
 
 
+def _entry_name(entry: dict) -> str:
+    return entry.get("first_name") or entry.get("username") or str(entry["user_id"])
+
+
 def _lb_keyboard():
     from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
     return InlineKeyboardMarkup(inline_keyboard=[
@@ -12,13 +12,14 @@ import logging
 import time
 import uuid
 from datetime import datetime
+from functools import partial
 
 from aiogram import Bot, F, Router
 from aiogram.fsm.context import FSMContext
 from aiogram.types import BufferedInputFile, CallbackQuery
 
 from .. import database as db
-from ..config import settings
+from ..callbacks import PayCB
 from ..keyboards import (
     pay_back_keyboard,
     pay_confirm_keyboard,
@@ -29,6 +30,7 @@ from ..keyboards import (
     subscription_menu_keyboard,
 )
 from ..payment_client import qris_client
+from ..payment_reaper import payment_reaper
 from ..qr_utils import generate_qr_png
 from ..security import is_admin
 from ..states import PaymentFlow
@@ -36,10 +38,12 @@ from ..subscription_manager import (
     Duration,
     Tier,
     TIER_LABELS,
+    TIER_LABELS_BY_VALUE,
     DURATION_LABELS,
+    DURATION_LABELS_BY_VALUE,
     subscription_manager,
 )
-from ..ui import clear_state, safe_edit_text
+from ..ui import clear_state, format_rp, safe_edit_text
 
 logger = logging.getLogger(__name__)
 
@@ -59,8 +63,16 @@ PRICES = {
 }
 
 
-def _format_rp(amount: int) -> str:
-    return f"Rp {amount:,}".replace(",", ".")
+def _clip(e: BaseException, n: int) -> str:
+    """HTML-safe error text, cut to ``n`` chars before escaping."""
+    s = str(e)
+    return html.escape(s if len(s) <= n else s[:n])
+
+
+# Static SKU prices never change at runtime, so render them once.
+PRICES_FORMATTED = {k: format_rp(v) for k, v in PRICES.items()}
+
+_STATUS_ICONS = {"paid": "✓", "pending": "⏳", "expired": "⏰"}
 
 
 # ---------------------------------------------------------------------------
@@ -84,10 +96,10 @@ async def pay_choose_tier(callback: CallbackQuery, state: FSMContext) -> None:
 # Step 2: choose duration (shows prices)
 # ---------------------------------------------------------------------------
 
-@router.callback_query(F.data.startswith("pay:tier:"))
-async def pay_choose_duration(callback: CallbackQuery) -> None:
-    tier = callback.data.replace("pay:tier:", "", 1)  # "basic" or "premium"
-    tier_label = TIER_LABELS.get(Tier(tier), tier)
+@router.callback_query(PayCB.filter(F.action == "tier"))
+async def pay_choose_duration(callback: CallbackQuery, callback_data: PayCB) -> None:
+    tier = callback_data.tier or ""  # "basic" or "premium"
+    tier_label = TIER_LABELS_BY_VALUE.get(tier, tier)
     text = f"<b>Beli {tier_label}</b>\n\nPilih durasi:"
     await safe_edit_text(
         callback.message,
@@ -101,26 +113,22 @@ async def pay_choose_duration(callback: CallbackQuery) -> None:
 # Step 3: confirm
 # ---------------------------------------------------------------------------
 
-@router.callback_query(F.data.startswith("pay:dur:"))
-async def pay_confirm(callback: CallbackQuery) -> None:
-    parts = callback.data.replace("pay:dur:", "", 1).split(":")
-    if len(parts) != 2:
-        await callback.answer("Invalid data", show_alert=True)
-        return
-    tier, duration = parts
+@router.callback_query(PayCB.filter(F.action == "dur"))
+async def pay_confirm(callback: CallbackQuery, callback_data: PayCB) -> None:
+    tier, duration = callback_data.tier, callback_data.duration
     price_key = f"{tier}_{duration}"
     amount = PRICES.get(price_key, 0)
     if amount <= 0:
         await callback.answer("Harga tidak tersedia", show_alert=True)
         return
 
-    tier_label = TIER_LABELS.get(Tier(tier), tier)
-    dur_label = DURATION_LABELS.get(Duration(duration), duration)
+    tier_label = TIER_LABELS_BY_VALUE.get(tier, tier)
+    dur_label = DURATION_LABELS_BY_VALUE.get(duration, duration)
     text = (
         f"<b>Konfirmasi Pembayaran</b>\n\n"
         f"Tier: <b>{tier_label}</b>\n"
         f"Durasi: <b>{dur_label}</b>\n"
-        f"Harga: <b>{_format_rp(amount)}</b>\n\n"
+        f"Harga: <b>{PRICES_FORMATTED[price_key]}</b>\n\n"
         f"Tekan tombol di bawah untuk lanjut ke pembayaran QRIS."
     )
     await safe_edit_text(
@@ -135,13 +143,11 @@ async def pay_confirm(callback: CallbackQuery) -> None:
 # Step 4: create QRIS & send QR image
 # ---------------------------------------------------------------------------
 
-@router.callback_query(F.data.startswith("pay:confirm:"))
-async def pay_create_qris(callback: CallbackQuery, state: FSMContext, bot: Bot) -> None:
-    parts = callback.data.replace("pay:confirm:", "", 1).split(":")
-    if len(parts) != 2:
-        await callback.answer("Invalid data", show_alert=True)
-        return
-    tier, duration = parts
+@router.callback_query(PayCB.filter(F.action == "confirm"))
+async def pay_create_qris(
+    callback: CallbackQuery, callback_data: PayCB, state: FSMContext, bot: Bot,
+) -> None:
+    tier, duration = callback_data.tier, callback_data.duration
     price_key = f"{tier}_{duration}"
     amount = PRICES.get(price_key, 0)
     if amount <= 0:
@@ -159,6 +165,14 @@ async def pay_create_qris(callback: CallbackQuery, state: FSMContext, bot: Bot)
         )
         return
 
+    if payment_reaper.is_full():
+        logger.warning("[Payment] Poller limit reached, rejecting user %s", user_id)
+        await callback.answer(
+            "Server sedang sibuk. Coba lagi beberapa saat lagi.",
+            show_alert=True,
+        )
+        return
+
     # Create order_id
     order_id = f"HUBIFY-{user_id}-{uuid.uuid4().hex[:8].upper()}"
 
@@ -172,10 +186,10 @@ async def pay_create_qris(callback: CallbackQuery, state: FSMContext, bot: Bot)
             customer_id=str(user_id),
         )
     except Exception as e:
-        logger.error("[Payment] QRIS create failed: %s", e)
+        logger.exception("[Payment] QRIS create failed: %s", e)
         await safe_edit_text(
             callback.message,
-            f"Gagal membuat QRIS:\n<code>{html.escape(str(e)[:200])}</code>",
+            f"Gagal membuat QRIS:\n<code>{_clip(e, 200)}</code>",
             reply_markup=pay_back_keyboard(),
         )
         return
@@ -194,13 +208,13 @@ async def pay_create_qris(callback: CallbackQuery, state: FSMContext, bot: Bot)
         amount=amount_total,
     )
 
-    tier_label = TIER_LABELS.get(Tier(tier), tier)
-    dur_label = DURATION_LABELS.get(Duration(duration), duration)
+    tier_label = TIER_LABELS_BY_VALUE.get(tier, tier)
+    dur_label = DURATION_LABELS_BY_VALUE.get(duration, duration)
     caption = (
         f"<b>Scan QRIS untuk Bayar</b>\n\n"
         f"Order: <code>{order_id}</code>\n"
         f"Tier: <b>{tier_label}</b> · {dur_label}\n"
-        f"Total: <b>{_format_rp(amount_total)}</b>\n"
+        f"Total: <b>{format_rp(amount_total)}</b>\n"
     )
     if expires_at:
         caption += f"Berlaku sampai: <b>{expires_at}</b>\n"
@@ -216,7 +230,7 @@ async def pay_create_qris(callback: CallbackQuery, state: FSMContext, bot: Bot)
     try:
         if not qris_content:
             raise ValueError("qris_content kosong dari API")
-        image_bytes = generate_qr_png(qris_content)
+        image_bytes = await asyncio.to_thread(generate_qr_png, qris_content)
         photo = BufferedInputFile(image_bytes, filename="qris.png")
         sent = await bot.send_photo(
             chat_id=chat_id,
@@ -230,7 +244,7 @@ async def pay_create_qris(callback: CallbackQuery, state: FSMContext, bot: Bot)
         # Fallback: send text-only
         sent = await bot.send_message(
             chat_id=chat_id,
-            text=caption + f"\n\n(QR image gagal dikirim: {html.escape(str(e)[:100])})",
+            text=caption + f"\n\n(QR image gagal dikirim: {_clip(e, 100)})",
             reply_markup=pay_waiting_keyboard(txn_id),
         )
         qr_message_id = sent.message_id
@@ -244,16 +258,16 @@ async def pay_create_qris(callback: CallbackQuery, state: FSMContext, bot: Bot)
     # Start background polling
     await state.set_state(PaymentFlow.waiting_confirm)
     await state.update_data(pay_txn_id=txn_id)
-    asyncio.create_task(
-        _poll_payment(
-            bot=bot,
-            chat_id=chat_id,
-            user_id=user_id,
-            transaction_id=txn_id,
-            tier=tier,
-            duration=duration,
-            qr_message_id=qr_message_id,
-        )
+    payment_reaper.add(
+        transaction_id=txn_id,
+        chat_id=chat_id,
+        on_paid=partial(
+            _grant_from_payment, bot, chat_id, user_id, txn_id, tier, duration,
+        ),
+        expired_text="⏰ QRIS expired. Buat transaksi baru.",
+        timeout_text="⏰ Waktu pembayaran habis. Buat transaksi baru.",
+        reply_markup=pay_back_keyboard(),
+        qr_message_id=qr_message_id,
     )
 
 
@@ -261,9 +275,9 @@ async def pay_create_qris(callback: CallbackQuery, state: FSMContext, bot: Bot)
 # Manual status check
 # ---------------------------------------------------------------------------
 
-@router.callback_query(F.data.startswith("pay:check:"))
-async def pay_manual_check(callback: CallbackQuery) -> None:
-    txn_id = callback.data.replace("pay:check:", "", 1)
+@router.callback_query(PayCB.filter(F.action == "check"))
+async def pay_manual_check(callback: CallbackQuery, callback_data: PayCB) -> None:
+    txn_id = callback_data.txn_id or ""
     try:
         result = await qris_client.check_status(txn_id)
         txn = result.get("transaction", {})
@@ -273,6 +287,7 @@ async def pay_manual_check(callback: CallbackQuery) -> None:
         return
 
     if status == "paid":
+        payment_reaper.notify(txn_id)
         await callback.answer("✅ Pembayaran terdeteksi! Subscription segera aktif.", show_alert=True)
     elif status == "pending":
         await callback.answer("⏳ Belum ada pembayaran. Silakan scan QRIS.", show_alert=True)
@@ -286,10 +301,11 @@ async def pay_manual_check(callback: CallbackQuery) -> None:
 # Cancel pending payment
 # ---------------------------------------------------------------------------
 
-@router.callback_query(F.data.startswith("pay:cancel:"))
-async def pay_cancel(callback: CallbackQuery, state: FSMContext) -> None:
-    txn_id = callback.data.replace("pay:cancel:", "", 1)
+@router.callback_query(PayCB.filter(F.action == "cancel"))
+async def pay_cancel(callback: CallbackQuery, callback_data: PayCB, state: FSMContext) -> None:
+    txn_id = callback_data.txn_id or ""
     await db.mark_payment_expired(txn_id)
+    payment_reaper.notify(txn_id, "expired")
     await clear_state(state)
 
     user_id = callback.from_user.id if callback.from_user else 0
@@ -326,13 +342,12 @@ async def pay_history(callback: CallbackQuery) -> None:
         return
 
     lines = ["<b>Riwayat Pembayaran</b>\n"]
-    status_icons = {"paid": "✓", "pending": "⏳", "expired": "⏰"}
     for p in payments:
-        icon = status_icons.get(p["status"], "❓")
-        tier_label = TIER_LABELS.get(Tier(p["tier"]), p["tier"]) if p["tier"] in [t.value for t in Tier] else p["tier"]
-        dt = datetime.fromtimestamp(p["created_at"]).strftime("%d/%m %H:%M") if p["created_at"] else "-"
+        icon = _STATUS_ICONS.get(p["status"], "❓")
+        tier_label = TIER_LABELS_BY_VALUE.get(p["tier"], p["tier"])
+        dt = time.strftime("%d/%m %H:%M", time.localtime(p["created_at"])) if p["created_at"] else "-"
         lines.append(
-            f"{icon} {dt} — {tier_label} — {_format_rp(p['amount'])} — {p['status']}"
+            f"{icon} {dt} — {tier_label} — {format_rp(p['amount'])} — {p['status']}"
         )
 
     await safe_edit_text(
@@ -344,82 +359,9 @@ async def pay_history(callback: CallbackQuery) -> None:
 
 
 # ---------------------------------------------------------------------------
-# Background payment poller
+# Grant on paid (called by the payment reaper)
 # ---------------------------------------------------------------------------
 
-async def _poll_payment(
-    bot: Bot,
-    chat_id: int,
-    user_id: int,
-    transaction_id: str,
-    tier: str,
-    duration: str,
-    qr_message_id: int | None = None,
-) -> None:
-    """Poll QRIS check-status until paid, expired, or timeout."""
-    interval = settings.QRIS_POLL_INTERVAL
-    timeout = settings.QRIS_POLL_TIMEOUT
-    start = time.time()
-
-    while time.time() - start < timeout:
-        await asyncio.sleep(interval)
-
-        # Check if payment was already processed (e.g. via webhook)
-        payment = await db.get_payment(transaction_id)
-        if payment and payment["status"] != "pending":
-            if payment["status"] == "paid":
-                logger.info("[Payment] Already processed by webhook: %s", transaction_id)
-            return
-
-        try:
-            result = await qris_client.check_status(transaction_id)
-            txn = result.get("transaction", {})
-            status = txn.get("status", "pending")
-        except Exception as e:
-            logger.warning("[Payment] Poll error for %s: %s", transaction_id, e)
-            continue
-
-        if status == "paid":
-            await _delete_qr_message(bot, chat_id, qr_message_id)
-            await _grant_from_payment(bot, chat_id, user_id, transaction_id, tier, duration)
-            return
-
-        if status == "expired":
-            await db.mark_payment_expired(transaction_id)
-            await _delete_qr_message(bot, chat_id, qr_message_id)
-            try:
-                await bot.send_message(
-                    chat_id=chat_id,
-                    text="⏰ QRIS expired. Buat transaksi baru.",
-                    reply_markup=pay_back_keyboard(),
-                )
-            except Exception:
-                pass
-            return
-
-    # Timeout — mark expired
-    await db.mark_payment_expired(transaction_id)
-    await _delete_qr_message(bot, chat_id, qr_message_id)
-    try:
-        await bot.send_message(
-            chat_id=chat_id,
-            text="⏰ Waktu pembayaran habis. Buat transaksi baru.",
-            reply_markup=pay_back_keyboard(),
-        )
-    except Exception:
-        pass
-
-
-async def _delete_qr_message(bot: Bot, chat_id: int, message_id: int | None) -> None:
-    """Delete the QR image message silently."""
-    if not message_id:
-        return
-    try:
-        await bot.delete_message(chat_id=chat_id, message_id=message_id)
-    except Exception:
-        pass
-
-
 async def _grant_from_payment(
     bot: Bot,
     chat_id: int,
@@ -432,7 +374,9 @@ async def _grant_from_payment(
     # Idempotency: only process if still pending
     marked = await db.mark_payment_paid(transaction_id)
     if not marked:
-        return  # already processed
+        # already processed (e.g. by the gateway webhook) — drop stale tier
+        subscription_manager.invalidate(user_id)
+        return
 
     try:
         tier_enum = Tier(tier)
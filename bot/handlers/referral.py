@@ -8,13 +8,14 @@ Features:
   - View referral stats
 """
 
+import asyncio
 import logging
 
-from aiogram import F, Router
+from aiogram import Bot, F, Router
 from aiogram.types import CallbackQuery
 
 from .. import database as db
-from ..keyboards import main_menu_keyboard
+from ..keyboards import referral_keyboard
 from ..ui import safe_edit_text
 
 logger = logging.getLogger(__name__)
@@ -23,6 +24,17 @@ router = Router()
 
 REFERRAL_BONUS_IMAGES = 10  # bonus images for each side
 
+# Bot username never changes for the process lifetime; fetched once.
+_bot_username: str | None = None
+
+
+async def _get_bot_username(bot: Bot) -> str:
+    global _bot_username
+    if _bot_username is None:
+        bot_info = await bot.get_me()
+        _bot_username = bot_info.username or "bot"
+    return _bot_username
+
 
 # ---------------------------------------------------------------------------
 # Show referral menu
@@ -31,16 +43,14 @@ REFERRAL_BONUS_IMAGES = 10  # bonus images for each side
 @router.callback_query(F.data == "menu:referral")
 async def show_referral_menu(callback: CallbackQuery) -> None:
     user_id = callback.from_user.id if callback.from_user else 0
-    user = await db.get_user(user_id)
+    user, ref_count, extra, bot_username = await asyncio.gather(
+        db.get_user(user_id),
+        db.count_referrals(user_id),
+        db.get_extra_quota(user_id),
+        _get_bot_username(callback.bot),
+    )
     ref_code = user.get("referral_code", f"ref_{user_id}") if user else f"ref_{user_id}"
-
-    # Get bot username from callback
-    bot_info = await callback.bot.get_me()
-    bot_username = bot_info.username or "bot"
-
     ref_link = f"https://t.me/{bot_username}?start={ref_code}"
-    ref_count = await db.count_referrals(user_id)
-    extra = await db.get_extra_quota(user_id)
 
     text = (
         "<b>🔗 Referral</b>\n"
@@ -54,7 +64,6 @@ async def show_referral_menu(callback: CallbackQuery) -> None:
         f"Extra saat ini: <b>{extra['images']}</b> img · <b>{extra['videos']}</b> vid"
     )
 
-    from ..keyboards import referral_keyboard
     await safe_edit_text(callback.message, text, reply_markup=referral_keyboard())
     await callback.answer()
 
@@ -81,19 +90,11 @@ async def process_referral(referred_id: int, referrer_id: int) -> str | None:
     if existing is not None:
         return None
 
-    # Create referral
-    ok = await db.create_referral(referrer_id, referred_id)
+    # Create referral, set referred_by and give bonus to both
+    ok = await db.apply_referral(referrer_id, referred_id, REFERRAL_BONUS_IMAGES)
     if not ok:
         return None
 
-    # Set referred_by on user
-    await db.set_referred_by(referred_id, referrer_id)
-
-    # Give bonus to both
-    await db.add_extra_quota(referrer_id, images=REFERRAL_BONUS_IMAGES)
-    await db.add_extra_quota(referred_id, images=REFERRAL_BONUS_IMAGES)
-    await db.mark_referral_bonus(referred_id)
-
     referrer_name = referrer.get("first_name", str(referrer_id))
     logger.info(
         "[Referral] %s referred %s — bonus +%d images each",
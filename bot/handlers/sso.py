@@ -1,3 +1,6 @@
+import asyncio
+from functools import wraps
+
 from aiogram import F, Router
 from aiogram.fsm.context import FSMContext
 from aiogram.types import CallbackQuery, Message
@@ -13,29 +16,67 @@ from ..ui import clear_state, safe_edit_text
 router = Router()
 local_sso_manager = LocalSSOManager(settings.SSO_FILE)
 
+_SSO_MENU_TEXT = "<b>🔑 SSO Manager</b>"
+_ADMIN_MENU_TEXT = "<b>Admin Panel</b>"
+_ACCESS_DENIED_TEXT = "Akses SSO manager ditolak"
+
+
+def admin_only(handler):
+    """Reject non-admin callback queries before the handler runs."""
+
+    @wraps(handler)
+    async def wrapper(callback: CallbackQuery, *args, **kwargs):
+        user_id = callback.from_user.id if callback.from_user else 0
+        if not is_admin(user_id):
+            await callback.answer(_ACCESS_DENIED_TEXT, show_alert=True)
+            return None
+        return await handler(callback, *args, **kwargs)
+
+    return wrapper
+
+
+# How long the follow-up waits for the gateway before reporting failure.
+_RELOAD_TIMEOUT = 30
+
+# Strong references to fire-and-forget reload tasks.
+_background_tasks: set[asyncio.Task] = set()
+
+
+def _spawn(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+async def _finalize_reload(reload_task: asyncio.Task, sent: Message, summary: str) -> None:
+    """Append the gateway reload result to an already-sent confirmation."""
+    try:
+        reload_result = await asyncio.wait_for(reload_task, timeout=_RELOAD_TIMEOUT)
+        text = f"{summary}\nReload: {reload_result}"
+    except Exception as exc:
+        text = f"{summary}\nReload gagal: {exc}"
+    try:
+        await sent.edit_text(text)
+    except Exception:
+        pass
+
 
 @router.callback_query(F.data == "menu:sso")
+@admin_only
 async def open_sso_menu(callback: CallbackQuery) -> None:
-    user_id = callback.from_user.id if callback.from_user else 0
-    if not is_admin(user_id):
-        await callback.answer("Akses SSO manager ditolak", show_alert=True)
-        return
-
-    await callback.message.edit_text(
-        "<b>🔑 SSO Manager</b>",
+    await safe_edit_text(
+        callback.message,
+        _SSO_MENU_TEXT,
         reply_markup=sso_menu_keyboard(),
     )
     await callback.answer()
 
 
 @router.callback_query(F.data == "sso:list")
+@admin_only
 async def list_sso_keys(callback: CallbackQuery) -> None:
-    user_id = callback.from_user.id if callback.from_user else 0
-    if not is_admin(user_id):
-        await callback.answer("Akses SSO manager ditolak", show_alert=True)
-        return
-
-    summary = local_sso_manager.get_masked_summary()
+    summary = await asyncio.to_thread(local_sso_manager.get_masked_summary)
     if not summary:
         text = "Belum ada key."
     else:
@@ -46,12 +87,8 @@ async def list_sso_keys(callback: CallbackQuery) -> None:
 
 
 @router.callback_query(F.data == "sso:add")
+@admin_only
 async def add_sso_start(callback: CallbackQuery, state: FSMContext) -> None:
-    user_id = callback.from_user.id if callback.from_user else 0
-    if not is_admin(user_id):
-        await callback.answer("Akses SSO manager ditolak", show_alert=True)
-        return
-
     await state.update_data(sso_return_menu="sso")
     await state.set_state(SSOFlow.waiting_new_key)
     await safe_edit_text(
@@ -63,12 +100,8 @@ async def add_sso_start(callback: CallbackQuery, state: FSMContext) -> None:
 
 
 @router.callback_query(F.data == "sso:add:cancel")
+@admin_only
 async def add_sso_cancel(callback: CallbackQuery, state: FSMContext) -> None:
-    user_id = callback.from_user.id if callback.from_user else 0
-    if not is_admin(user_id):
-        await callback.answer("Akses SSO manager ditolak", show_alert=True)
-        return
-
     data = await state.get_data()
     return_menu = data.get("sso_return_menu", "sso")
     await clear_state(state)
@@ -76,13 +109,13 @@ async def add_sso_cancel(callback: CallbackQuery, state: FSMContext) -> None:
     if return_menu == "admin":
         await safe_edit_text(
             callback.message,
-            "<b>Admin Panel</b>",
+            _ADMIN_MENU_TEXT,
             reply_markup=admin_menu_keyboard(),
         )
     else:
         await safe_edit_text(
             callback.message,
-            "<b>🔑 SSO Manager</b>",
+            _SSO_MENU_TEXT,
             reply_markup=sso_menu_keyboard(),
         )
     await callback.answer("Dibatalkan")
@@ -93,20 +126,20 @@ async def add_sso_finish(message: Message, state: FSMContext) -> None:
     user_id = message.from_user.id if message.from_user else 0
     if not is_admin(user_id):
         await clear_state(state)
-        await message.answer("Akses SSO manager ditolak")
+        await message.answer(_ACCESS_DENIED_TEXT)
         return
 
     data = await state.get_data()
     return_menu = data.get("sso_return_menu", "sso")
     value = (message.text or "").strip()
-    result = local_sso_manager.add_key(value)
+    result = await asyncio.to_thread(local_sso_manager.add_key, value)
     await clear_state(state)
 
     if return_menu == "admin":
-        menu_text = "<b>Admin Panel</b>"
+        menu_text = _ADMIN_MENU_TEXT
         menu_keyboard = admin_menu_keyboard()
     else:
-        menu_text = "<b>🔑 SSO Manager</b>"
+        menu_text = _SSO_MENU_TEXT
         menu_keyboard = sso_menu_keyboard()
 
     if result["status"] == "error":
@@ -123,33 +156,20 @@ async def add_sso_finish(message: Message, state: FSMContext) -> None:
         await message.answer(menu_text, reply_markup=menu_keyboard)
         return
 
-    try:
-        reload_result = await gateway_client.reload_sso()
-        before_count = int(result.get("before_count", 0) or 0)
-        after_count = int(result.get("after_count", before_count) or before_count)
-        await message.answer(
-            f"{result['message']}\n"
-            f"Total: {before_count} → {after_count}\n"
-            f"Reload: {reload_result}"
-        )
-    except Exception as exc:
-        before_count = int(result.get("before_count", 0) or 0)
-        after_count = int(result.get("after_count", before_count) or before_count)
-        await message.answer(
-            f"{result['message']}\n"
-            f"Total: {before_count} → {after_count}\n"
-            f"Reload gagal: {exc}"
-        )
+    # Start the gateway reload right away and confirm without waiting for it;
+    # the confirmation is edited once the reload result comes back.
+    reload_task = _spawn(gateway_client.reload_sso())
+    before_count = int(result.get("before_count", 0) or 0)
+    after_count = int(result.get("after_count", before_count) or before_count)
+    summary = f"{result['message']}\nTotal: {before_count} → {after_count}"
+    sent = await message.answer(f"✅ {summary}")
+    _spawn(_finalize_reload(reload_task, sent, f"✅ {summary}"))
     await message.answer(menu_text, reply_markup=menu_keyboard)
 
 
 @router.callback_query(F.data == "sso:reload")
+@admin_only
 async def sso_reload(callback: CallbackQuery) -> None:
-    user_id = callback.from_user.id if callback.from_user else 0
-    if not is_admin(user_id):
-        await callback.answer("Akses SSO manager ditolak", show_alert=True)
-        return
-
     try:
         payload = await gateway_client.reload_sso()
         await safe_edit_text(callback.message, f"Reload SSO: {payload}", reply_markup=sso_menu_keyboard())
@@ -160,13 +180,9 @@ async def sso_reload(callback: CallbackQuery) -> None:
 
 
 @router.callback_query(F.data == "sso:remove_last")
+@admin_only
 async def sso_remove_last(callback: CallbackQuery) -> None:
-    user_id = callback.from_user.id if callback.from_user else 0
-    if not is_admin(user_id):
-        await callback.answer("Akses SSO manager ditolak", show_alert=True)
-        return
-
-    result = local_sso_manager.remove_last_key()
+    result = await asyncio.to_thread(local_sso_manager.remove_last_key)
     if result["status"] != "ok":
         await safe_edit_text(callback.message, result['message'], reply_markup=sso_menu_keyboard())
         await callback.answer()
@@ -1,7 +1,8 @@
 """Subscription management handlers for the Telegram bot."""
 
-import html
+import math
 from datetime import datetime
+from functools import lru_cache
 
 from aiogram import F, Router
 from aiogram.fsm.context import FSMContext
@@ -13,13 +14,15 @@ from ..keyboards import (
     main_menu_keyboard,
     subscription_admin_keyboard,
     subscription_menu_keyboard,
+    subs_list_keyboard,
 )
-from ..security import is_admin
+from ..middlewares import AdminFlagMiddleware
 from ..states import SubsAdminFlow
 from ..subscription_manager import (
     Duration,
     Tier,
     TIER_LABELS,
+    TIER_LABELS_BY_VALUE,
     TIER_LIMITS,
     UNLIMITED,
     DURATION_LABELS,
@@ -29,52 +32,63 @@ from ..ui import clear_state, get_backend, safe_edit_text
 from .common import HOME_TEXT
 
 router = Router()
+router.callback_query.middleware(AdminFlagMiddleware())
 
+SUBS_PAGE_SIZE = 20
 
-# ---------------------------------------------------------------------------
-# User-facing: subscription info
-# ---------------------------------------------------------------------------
-
-@router.callback_query(F.data == "menu:subs")
-async def open_subs_menu(callback: CallbackQuery, state: FSMContext) -> None:
-    await clear_state(state)
-    user_id = callback.from_user.id if callback.from_user else 0
-    kb = subscription_admin_keyboard() if is_admin(user_id) else subscription_menu_keyboard()
-    info = await subscription_manager.get_info_text(user_id)
-    await safe_edit_text(callback.message, info, reply_markup=kb)
-    await callback.answer()
 
+def _uid(cb: CallbackQuery) -> int:
+    return cb.from_user.id if cb.from_user else 0
 
-@router.callback_query(F.data == "subs:info")
-async def show_sub_info(callback: CallbackQuery) -> None:
-    user_id = callback.from_user.id if callback.from_user else 0
-    kb = subscription_admin_keyboard() if is_admin(user_id) else subscription_menu_keyboard()
-    info = await subscription_manager.get_info_text(user_id)
-    await safe_edit_text(callback.message, info, reply_markup=kb)
-    await callback.answer()
 
-
-@router.callback_query(F.data == "subs:tiers")
-async def show_tier_comparison(callback: CallbackQuery) -> None:
-    lines = [
-        "<b>Perbandingan Tier</b>",
-        "<i>Semakin tinggi tier, semakin banyak kuota</i>\n",
-    ]
+def _build_tier_comparison() -> str:
+    blocks = []
     for tier in Tier:
         lim = TIER_LIMITS[tier]
         img_txt = "∞ (tanpa batas)" if lim.is_unlimited_images else f"{lim.images_per_day}/hari"
         vid_txt = "∞ (tanpa batas)" if lim.is_unlimited_videos else f"{lim.videos_per_day}/hari"
-        lines.append(
+        blocks.append(
             f"<b>{TIER_LABELS[tier]}</b>\n"
             f"  Gambar: {img_txt}\n"
             f"  Video: {vid_txt}\n"
             f"  Max {lim.max_images_per_request} gambar/permintaan · Batch {lim.max_batch_prompts}"
         )
-        lines.append("")
+    return (
+        "<b>Perbandingan Tier</b>\n"
+        "<i>Semakin tinggi tier, semakin banyak kuota</i>\n\n"
+        + "\n\n".join(blocks)
+        + "\n"
+    )
+
+
+# TIER_LIMITS is static, so the comparison text is built once at import.
+_TIER_COMPARISON_TEXT = _build_tier_comparison()
+
+
+@lru_cache(maxsize=1024)
+def _fmt_ts(ts: float) -> str:
+    """Local ``YYYY-MM-DD HH:MM``; bulk grants share expiries, so cache it."""
+    dt = datetime.fromtimestamp(ts)
+    return f"{dt.year:04d}-{dt.month:02d}-{dt.day:02d} {dt.hour:02d}:{dt.minute:02d}"
+
 
-    user_id = callback.from_user.id if callback.from_user else 0
-    kb = subscription_admin_keyboard() if is_admin(user_id) else subscription_menu_keyboard()
-    await safe_edit_text(callback.message, "\n".join(lines), reply_markup=kb)
+# ---------------------------------------------------------------------------
+# User-facing: subscription info
+# ---------------------------------------------------------------------------
+
+@router.callback_query(F.data.in_({"menu:subs", "subs:info"}))
+async def open_subs_menu(callback: CallbackQuery, state: FSMContext, is_admin: bool) -> None:
+    await clear_state(state)
+    kb = subscription_admin_keyboard() if is_admin else subscription_menu_keyboard()
+    info = await subscription_manager.get_info_text(_uid(callback))
+    await safe_edit_text(callback.message, info, reply_markup=kb)
+    await callback.answer()
+
+
+@router.callback_query(F.data == "subs:tiers")
+async def show_tier_comparison(callback: CallbackQuery, is_admin: bool) -> None:
+    kb = subscription_admin_keyboard() if is_admin else subscription_menu_keyboard()
+    await safe_edit_text(callback.message, _TIER_COMPARISON_TEXT, reply_markup=kb)
     await callback.answer()
 
 
@@ -83,8 +97,8 @@ async def show_tier_comparison(callback: CallbackQuery) -> None:
 # ---------------------------------------------------------------------------
 
 @router.callback_query(F.data == "subs:grant")
-async def grant_start(callback: CallbackQuery, state: FSMContext) -> None:
-    if not is_admin(callback.from_user.id if callback.from_user else 0):
+async def grant_start(callback: CallbackQuery, state: FSMContext, is_admin: bool) -> None:
+    if not is_admin:
         await callback.answer("Admin only", show_alert=True)
         return
     await state.set_state(SubsAdminFlow.waiting_user_id)
@@ -97,8 +111,8 @@ async def grant_start(callback: CallbackQuery, state: FSMContext) -> None:
 
 
 @router.callback_query(F.data == "subs:revoke")
-async def revoke_start(callback: CallbackQuery, state: FSMContext) -> None:
-    if not is_admin(callback.from_user.id if callback.from_user else 0):
+async def revoke_start(callback: CallbackQuery, state: FSMContext, is_admin: bool) -> None:
+    if not is_admin:
         await callback.answer("Admin only", show_alert=True)
         return
     await state.set_state(SubsAdminFlow.waiting_user_id)
@@ -113,11 +127,12 @@ async def revoke_start(callback: CallbackQuery, state: FSMContext) -> None:
 @router.message(SubsAdminFlow.waiting_user_id)
 async def handle_user_id(message: Message, state: FSMContext) -> None:
     text = (message.text or "").strip()
-    try:
-        target_uid = int(text)
-    except ValueError:
+    # ASCII-only check: str.isdigit() also accepts digits int() rejects ("²")
+    digits = text.removeprefix("-")
+    if not (digits.isascii() and digits.isdigit()):
         await message.answer("User ID harus angka. Coba lagi:")
         return
+    target_uid = int(text)
 
     data = await state.get_data()
     action = data.get("subs_action", "grant")
@@ -133,9 +148,7 @@ async def handle_user_id(message: Message, state: FSMContext) -> None:
         return
 
     # grant flow: choose tier
-    await state.update_data(subs_target_uid=target_uid)
-    await clear_state(state)
-    await state.update_data(subs_target_uid=target_uid)
+    await clear_state(state, subs_target_uid=target_uid)
     await message.answer(
         f"Pilih tier untuk user <b>{target_uid}</b>:",
         reply_markup=grant_tier_keyboard(),
@@ -143,11 +156,11 @@ async def handle_user_id(message: Message, state: FSMContext) -> None:
 
 
 @router.callback_query(F.data.startswith("subs:grant:"))
-async def grant_choose_tier(callback: CallbackQuery, state: FSMContext) -> None:
-    if not is_admin(callback.from_user.id if callback.from_user else 0):
+async def grant_choose_tier(callback: CallbackQuery, state: FSMContext, is_admin: bool) -> None:
+    if not is_admin:
         await callback.answer("Admin only", show_alert=True)
         return
-    tier_str = callback.data.replace("subs:grant:", "", 1)
+    tier_str = callback.data.removeprefix("subs:grant:")
     data = await state.get_data()
     target_uid = data.get("subs_target_uid")
     if not target_uid:
@@ -163,13 +176,12 @@ async def grant_choose_tier(callback: CallbackQuery, state: FSMContext) -> None:
 
 
 @router.callback_query(F.data.startswith("subs:dur:"))
-async def grant_choose_duration(callback: CallbackQuery, state: FSMContext) -> None:
-    admin_id = callback.from_user.id if callback.from_user else 0
-    if not is_admin(admin_id):
+async def grant_choose_duration(callback: CallbackQuery, state: FSMContext, is_admin: bool) -> None:
+    if not is_admin:
         await callback.answer("Admin only", show_alert=True)
         return
 
-    parts = callback.data.replace("subs:dur:", "", 1).split(":")
+    parts = callback.data.removeprefix("subs:dur:").split(":")
     if len(parts) != 2:
         await callback.answer("Invalid data", show_alert=True)
         return
@@ -192,10 +204,10 @@ async def grant_choose_duration(callback: CallbackQuery, state: FSMContext) -> N
         user_id=target_uid,
         tier=tier,
         duration=duration,
-        granted_by=admin_id,
+        granted_by=_uid(callback),
     )
 
-    exp_text = datetime.fromtimestamp(sub.expires).strftime("%Y-%m-%d %H:%M")
+    exp_text = _fmt_ts(sub.expires)
     text = (
         f"<b>Subscription Granted</b>\n\n"
         f"User: <b>{target_uid}</b>\n"
@@ -213,12 +225,23 @@ async def grant_choose_duration(callback: CallbackQuery, state: FSMContext) -> N
 # ---------------------------------------------------------------------------
 
 @router.callback_query(F.data == "subs:list")
-async def list_active_subs(callback: CallbackQuery) -> None:
-    if not is_admin(callback.from_user.id if callback.from_user else 0):
+@router.callback_query(F.data.startswith("subs:list:p:"))
+async def list_active_subs(callback: CallbackQuery, is_admin: bool) -> None:
+    if not is_admin:
         await callback.answer("Admin only", show_alert=True)
         return
 
-    subs = await subscription_manager.list_active()
+    try:
+        page = int(callback.data.removeprefix("subs:list:p:"))
+    except ValueError:
+        page = 0
+
+    total = await subscription_manager.count_active()
+    total_pages = max(1, math.ceil(total / SUBS_PAGE_SIZE))
+    page = max(0, min(page, total_pages - 1))
+    subs = await subscription_manager.list_active(
+        offset=page * SUBS_PAGE_SIZE, limit=SUBS_PAGE_SIZE,
+    )
     if not subs:
         await safe_edit_text(
             callback.message,
@@ -228,15 +251,15 @@ async def list_active_subs(callback: CallbackQuery) -> None:
         await callback.answer()
         return
 
-    lines = ["<b>Active Subscriptions</b>\n"]
+    parts: list[str] = [f"<b>Active Subscriptions</b> · {total}\n"]
     for s in subs:
-        tier_label = TIER_LABELS.get(Tier(s["tier"]), s["tier"])
-        exp = datetime.fromtimestamp(s["expires"]).strftime("%Y-%m-%d %H:%M") if s["expires"] else "∞"
-        lines.append(f"• <b>{s['user_id']}</b> — {tier_label} (exp: {exp})")
+        tier_label = TIER_LABELS_BY_VALUE.get(s["tier"], s["tier"])
+        exp = _fmt_ts(s["expires"]) if s["expires"] else "∞"
+        parts.append(f"• <b>{s['user_id']}</b> — {tier_label} (exp: {exp})")
 
     await safe_edit_text(
         callback.message,
-        "\n".join(lines),
-        reply_markup=subscription_admin_keyboard(),
+        "\n".join(parts),
+        reply_markup=subs_list_keyboard(page, total_pages),
     )
     await callback.answer()
@@ -11,19 +11,24 @@ Packs:
 import asyncio
 import html
 import logging
-import time
 import uuid
-from datetime import datetime
+from functools import partial
 
 from aiogram import Bot, F, Router
-from aiogram.types import BufferedInputFile, CallbackQuery
+from aiogram.types import (
+    BufferedInputFile,
+    CallbackQuery,
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+)
 
 from .. import database as db
-from ..config import settings
 from ..keyboards import pay_back_keyboard
 from ..payment_client import qris_client
+from ..payment_reaper import payment_reaper
 from ..qr_utils import generate_qr_png
-from ..ui import safe_edit_text
+from ..user_limit_manager import user_limit_manager
+from ..ui import format_rp, safe_edit_text
 
 logger = logging.getLogger(__name__)
 
@@ -41,37 +46,33 @@ TOPUP_PACKS = {
 }
 
 
-def _format_rp(amount: int) -> str:
-    return f"Rp {amount:,}".replace(",", ".")
-
-
-def _topup_menu_keyboard():
-    from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
-    rows = []
-    for pack_id, pack in TOPUP_PACKS.items():
-        icon = "🖼" if pack['images'] else "🎬"
-        rows.append([InlineKeyboardButton(
-            text=f"{icon} {pack['label']} — {_format_rp(pack['price'])}",
+# TOPUP_PACKS is static, so the menu and per-pack confirm keyboards are
+# built once at import.
+_TOPUP_MENU_KB = InlineKeyboardMarkup(inline_keyboard=[
+    *(
+        [InlineKeyboardButton(
+            text=f"{'🖼' if pack['images'] else '🎬'} {pack['label']} — {format_rp(pack['price'])}",
             callback_data=f"topup:buy:{pack_id}",
-        )])
-    rows.append([InlineKeyboardButton(text="Cek Saldo Extra", callback_data="topup:balance")])
-    rows.append([InlineKeyboardButton(text="← Kembali", callback_data="menu:home")])
-    return InlineKeyboardMarkup(inline_keyboard=rows)
-
-
-def _topup_confirm_keyboard(pack_id: str, price: int):
-    from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
-    return InlineKeyboardMarkup(inline_keyboard=[
+        )]
+        for pack_id, pack in TOPUP_PACKS.items()
+    ),
+    [InlineKeyboardButton(text="Cek Saldo Extra", callback_data="topup:balance")],
+    [InlineKeyboardButton(text="← Kembali", callback_data="menu:home")],
+])
+
+_TOPUP_CONFIRM_KBS = {
+    pack_id: InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(
-            text=f"Bayar {_format_rp(price)}",
+            text=f"Bayar {format_rp(pack['price'])}",
             callback_data=f"topup:confirm:{pack_id}",
         )],
         [InlineKeyboardButton(text="✕ Batal", callback_data="menu:topup")],
     ])
+    for pack_id, pack in TOPUP_PACKS.items()
+}
 
 
-def _topup_waiting_keyboard(txn_id: str):
-    from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+def _topup_waiting_keyboard(txn_id: str) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="↻ Cek Status", callback_data=f"topup:check:{txn_id}")],
         [InlineKeyboardButton(text="✕ Batalkan", callback_data=f"topup:cancel:{txn_id}")],
@@ -94,7 +95,7 @@ async def show_topup_menu(callback: CallbackQuery) -> None:
         f"Saldo extra kamu: <b>{extra['images']}</b> img · <b>{extra['videos']}</b> vid\n\n"
         "Pilih paket di bawah:"
     )
-    await safe_edit_text(callback.message, text, reply_markup=_topup_menu_keyboard())
+    await safe_edit_text(callback.message, text, reply_markup=_TOPUP_MENU_KB)
     await callback.answer()
 
 
@@ -117,23 +118,24 @@ async def topup_balance(callback: CallbackQuery) -> None:
 
 @router.callback_query(F.data.startswith("topup:buy:"))
 async def topup_buy(callback: CallbackQuery) -> None:
-    pack_id = callback.data.replace("topup:buy:", "", 1)
-    pack = TOPUP_PACKS.get(pack_id)
-    if not pack:
+    pack_id = callback.data.removeprefix("topup:buy:")
+    try:
+        pack = TOPUP_PACKS[pack_id]
+    except KeyError:
         await callback.answer("Paket tidak ditemukan", show_alert=True)
         return
 
     text = (
         f"<b>Konfirmasi Topup</b>\n\n"
         f"Paket: <b>{pack['label']}</b>\n"
-        f"Harga: <b>{_format_rp(pack['price'])}</b>\n\n"
+        f"Harga: <b>{format_rp(pack['price'])}</b>\n\n"
         f"Kuota langsung ditambahkan ke saldo extra kamu\n"
         f"setelah pembayaran berhasil."
     )
     await safe_edit_text(
         callback.message,
         text,
-        reply_markup=_topup_confirm_keyboard(pack_id, pack["price"]),
+        reply_markup=_TOPUP_CONFIRM_KBS[pack_id],
     )
     await callback.answer()
 
@@ -142,15 +144,51 @@ async def topup_buy(callback: CallbackQuery) -> None:
 # Confirm & create QRIS
 # ---------------------------------------------------------------------------
 
+# Strong references to fire-and-forget tasks.
+_background_tasks: set[asyncio.Task] = set()
+
+
+async def _safe_delete(bot: Bot, chat_id: int, message_id: int) -> None:
+    try:
+        await bot.delete_message(chat_id=chat_id, message_id=message_id)
+    except Exception as e:
+        logger.debug("[Topup] Could not delete message %s: %s", message_id, e)
+
+
+# user_id → lock held while that user's topup transaction is being opened,
+# so a double-tapped "Bayar" cannot create two QRIS transactions.
+_user_topup_locks: dict[int, asyncio.Lock] = {}
+
+
 @router.callback_query(F.data.startswith("topup:confirm:"))
 async def topup_create_qris(callback: CallbackQuery, bot: Bot) -> None:
-    pack_id = callback.data.replace("topup:confirm:", "", 1)
-    pack = TOPUP_PACKS.get(pack_id)
-    if not pack:
+    pack_id = callback.data.removeprefix("topup:confirm:")
+    try:
+        pack = TOPUP_PACKS[pack_id]
+    except KeyError:
         await callback.answer("Paket tidak valid", show_alert=True)
         return
 
     user_id = callback.from_user.id
+    lock = _user_topup_locks.setdefault(user_id, asyncio.Lock())
+    if lock.locked():
+        await callback.answer("Topup sedang diproses…")
+        return
+    try:
+        async with lock:
+            await _create_topup_qris(callback, bot, user_id, pack_id, pack)
+    finally:
+        if not lock.locked():
+            _user_topup_locks.pop(user_id, None)
+
+
+async def _create_topup_qris(
+    callback: CallbackQuery,
+    bot: Bot,
+    user_id: int,
+    pack_id: str,
+    pack: dict,
+) -> None:
     amount = pack["price"]
     order_id = f"TOPUP-{user_id}-{uuid.uuid4().hex[:8].upper()}"
 
@@ -160,6 +198,14 @@ async def topup_create_qris(callback: CallbackQuery, bot: Bot) -> None:
         await callback.answer("Masih ada pembayaran pending. Selesaikan dulu.", show_alert=True)
         return
 
+    if payment_reaper.is_full():
+        logger.warning("[Topup] Poller limit reached, rejecting user %s", user_id)
+        await callback.answer(
+            "Server sedang sibuk. Coba lagi beberapa saat lagi.",
+            show_alert=True,
+        )
+        return
+
     await safe_edit_text(callback.message, "⏳ Membuat QRIS topup…")
     await callback.answer()
 
@@ -195,7 +241,7 @@ async def topup_create_qris(callback: CallbackQuery, bot: Bot) -> None:
         f"<b>Scan QRIS untuk Bayar</b>\n\n"
         f"Order: <code>{order_id}</code>\n"
         f"Paket: <b>{pack['label']}</b>\n"
-        f"Total: <b>{_format_rp(amount_total)}</b>\n\n"
+        f"Total: <b>{format_rp(amount_total)}</b>\n\n"
         f"Buka aplikasi e-wallet (GoPay, OVO, Dana, dll),\n"
         f"scan kode QR di atas, lalu bayar.\n\n"
         f"<i>Bot otomatis mengecek pembayaran.</i>"
@@ -206,7 +252,7 @@ async def topup_create_qris(callback: CallbackQuery, bot: Bot) -> None:
     try:
         if not qris_content:
             raise ValueError("qris_content kosong dari API")
-        image_bytes = generate_qr_png(qris_content)
+        image_bytes = await asyncio.to_thread(generate_qr_png, qris_content)
         photo = BufferedInputFile(image_bytes, filename="qris_topup.png")
         sent = await bot.send_photo(
             chat_id=chat_id,
@@ -224,14 +270,19 @@ async def topup_create_qris(callback: CallbackQuery, bot: Bot) -> None:
         )
         qr_message_id = sent.message_id
 
-    try:
-        await callback.message.delete()
-    except Exception:
-        pass
+    # Drop the "creating QRIS" message without waiting on Telegram
+    task = asyncio.create_task(_safe_delete(bot, chat_id, callback.message.message_id))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
 
-    # Start background polling
-    asyncio.create_task(
-        _poll_topup(bot, chat_id, user_id, txn_id, pack_id, qr_message_id)
+    # Hand over to the shared background poller
+    payment_reaper.add(
+        transaction_id=txn_id,
+        chat_id=chat_id,
+        on_paid=partial(_grant_topup, bot, chat_id, user_id, txn_id, pack_id),
+        expired_text="⏰ QRIS topup expired.",
+        timeout_text="⏰ Waktu topup habis.",
+        qr_message_id=qr_message_id,
     )
 
 
@@ -241,7 +292,7 @@ async def topup_create_qris(callback: CallbackQuery, bot: Bot) -> None:
 
 @router.callback_query(F.data.startswith("topup:check:"))
 async def topup_check(callback: CallbackQuery) -> None:
-    txn_id = callback.data.replace("topup:check:", "", 1)
+    txn_id = callback.data.removeprefix("topup:check:")
     try:
         result = await qris_client.check_status(txn_id)
         status = result.get("transaction", {}).get("status", "unknown")
@@ -249,6 +300,9 @@ async def topup_check(callback: CallbackQuery) -> None:
         await callback.answer(f"Error: {str(e)[:50]}", show_alert=True)
         return
 
+    if status == "paid":
+        payment_reaper.notify(txn_id)
+
     icons = {"paid": "✓ Sudah dibayar", "pending": "⏳ Belum dibayar", "expired": "⏰ Expired"}
     await callback.answer(icons.get(status, f"Status: {status}"), show_alert=True)
 
@@ -259,9 +313,10 @@ async def topup_check(callback: CallbackQuery) -> None:
 
 @router.callback_query(F.data.startswith("topup:cancel:"))
 async def topup_cancel(callback: CallbackQuery) -> None:
-    txn_id = callback.data.replace("topup:cancel:", "", 1)
+    txn_id = callback.data.removeprefix("topup:cancel:")
     await db.mark_payment_expired(txn_id)
-    await callback.message.answer("Topup dibatalkan.", reply_markup=_topup_menu_keyboard())
+    payment_reaper.notify(txn_id, "expired")
+    await callback.message.answer("Topup dibatalkan.", reply_markup=_TOPUP_MENU_KB)
     await callback.answer()
     try:
         await callback.message.delete()
@@ -270,69 +325,9 @@ async def topup_cancel(callback: CallbackQuery) -> None:
 
 
 # ---------------------------------------------------------------------------
-# Background poller
+# Grant on paid (called by the payment reaper)
 # ---------------------------------------------------------------------------
 
-async def _poll_topup(
-    bot: Bot,
-    chat_id: int,
-    user_id: int,
-    transaction_id: str,
-    pack_id: str,
-    qr_message_id: int | None = None,
-) -> None:
-    interval = settings.QRIS_POLL_INTERVAL
-    timeout = settings.QRIS_POLL_TIMEOUT
-    start = time.time()
-
-    while time.time() - start < timeout:
-        await asyncio.sleep(interval)
-
-        payment = await db.get_payment(transaction_id)
-        if payment and payment["status"] != "pending":
-            if payment["status"] == "paid":
-                logger.info("[Topup] Already processed: %s", transaction_id)
-            return
-
-        try:
-            result = await qris_client.check_status(transaction_id)
-            status = result.get("transaction", {}).get("status", "pending")
-        except Exception as e:
-            logger.warning("[Topup] Poll error %s: %s", transaction_id, e)
-            continue
-
-        if status == "paid":
-            await _delete_qr_message(bot, chat_id, qr_message_id)
-            await _grant_topup(bot, chat_id, user_id, transaction_id, pack_id)
-            return
-
-        if status == "expired":
-            await db.mark_payment_expired(transaction_id)
-            await _delete_qr_message(bot, chat_id, qr_message_id)
-            try:
-                await bot.send_message(chat_id, "⏰ QRIS topup expired.")
-            except Exception:
-                pass
-            return
-
-    await db.mark_payment_expired(transaction_id)
-    await _delete_qr_message(bot, chat_id, qr_message_id)
-    try:
-        await bot.send_message(chat_id, "⏰ Waktu topup habis.")
-    except Exception:
-        pass
-
-
-async def _delete_qr_message(bot: Bot, chat_id: int, message_id: int | None) -> None:
-    """Delete the QR image message silently."""
-    if not message_id:
-        return
-    try:
-        await bot.delete_message(chat_id=chat_id, message_id=message_id)
-    except Exception:
-        pass
-
-
 async def _grant_topup(
     bot: Bot,
     chat_id: int,
@@ -349,9 +344,8 @@ async def _grant_topup(
         logger.error("[Topup] Unknown pack: %s", pack_id)
         return
 
-    await db.add_extra_quota(user_id, images=pack["images"], videos=pack["videos"])
-
-    extra = await db.get_extra_quota(user_id)
+    extra = await db.add_extra_quota(user_id, images=pack["images"], videos=pack["videos"])
+    user_limit_manager.invalidate(user_id)
     text = (
         f"<b>Topup Berhasil!</b>\n\n"
         f"Paket: <b>{pack['label']}</b>\n"
@@ -1,33 +1,82 @@
+import asyncio
 import html
+import logging
+import re
+import stat
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from functools import lru_cache
 from pathlib import Path
-from urllib.parse import unquote, urlparse
+from typing import Any, Dict
+from urllib.parse import unquote, urlparse, urlsplit
 
 from aiogram import F, Router
 from aiogram.fsm.context import FSMContext
-from aiogram.types import CallbackQuery, FSInputFile, Message
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.types import BufferedInputFile, CallbackQuery, FSInputFile, InputFile, Message
 
 from ..client import gateway_client
 from ..keyboards import main_menu_keyboard, video_menu_keyboard
-from ..rate_limiter import check_cooldown, record_request
+from ..middlewares import UserIdMiddleware
+from ..rate_limiter import record_request
 from ..security import is_admin
 from ..states import VideoFlow
-from ..subscription_manager import subscription_manager
-from ..ui import clear_state, get_backend, safe_edit_text
+from ..ui import (
+    clear_state,
+    get_backend,
+    register_state_mirror,
+    safe_edit_reply_markup,
+    safe_edit_text,
+)
 from ..user_limit_manager import user_limit_manager
 from .common import HOME_TEXT
 
+logger = logging.getLogger(__name__)
+
 router = Router()
+router.callback_query.middleware(UserIdMiddleware())
+router.message.middleware(UserIdMiddleware())
 ROOT_DIR = Path(__file__).resolve().parents[2]
 VIDEOS_DIR = ROOT_DIR / "data" / "videos"
 
-# Backend → video model mapping
-BACKEND_VIDEO_MODEL = {
-    "grok": "grok-2-video",
-    "gemini": "gemini-veo",
+# Bot API multipart upload cap; larger files can only be sent as a link.
+UPLOAD_SIZE_LIMIT = 50 * 1024 * 1024
+
+# Recently sent local videos kept in memory, bounded by total size; big
+# files are always streamed from disk.
+VIDEO_CACHE_BYTES = 64 * 1024 * 1024
+VIDEO_CACHE_MAX_FILE = 16 * 1024 * 1024
+
+# Error classification for gateway failures, in one pass over the message
+_ERR_RE = re.compile(
+    r"(?P<forbidden>403)"
+    r"|(?P<cf>Just a moment|DOCTYPE|Cloudflare)"
+    r"|(?P<rate>rate_limit|429)"
+    r"|(?P<auth>401|(?i:unauthorized))",  # only this one ignored case before
+)
+
+# After a Cloudflare 403 the gateway keeps failing until CF_CLEARANCE is
+# updated; fail fast for this long instead of sending every queued prompt.
+CF_BLOCK_COOLDOWN = 45
+_cf_blocked_until = 0.0
+
+
+class _CloudflareBlocked(Exception):
+    """Raised instead of calling the gateway while a Cloudflare block is fresh."""
+
+
+# Backend → video model, and the fixed (aspect, duration, resolution, preset)
+# for backends without user settings
+_VIDEO_CONFIG = {
+    "grok": {"model": "grok-2-video", "fixed": None},
+    "gemini": {"model": "gemini-veo", "fixed": ("16:9", 8, "720p", "normal")},
 }
 
 
-def _resolve_local_video_path(url: str) -> Path | None:
+@lru_cache(maxsize=1024)
+def _local_video_candidate(url: str) -> Path | None:
+    """Map a gateway video URL to its path under VIDEOS_DIR (no disk access)."""
     try:
         parsed = urlparse(url)
         filename = Path(unquote(parsed.path)).name
@@ -35,20 +84,60 @@ def _resolve_local_video_path(url: str) -> Path | None:
         return None
     if not filename:
         return None
-    file_path = VIDEOS_DIR / filename
-    if file_path.exists() and file_path.is_file():
-        return file_path
-    return None
+    return VIDEOS_DIR / filename
+
+
+def _resolve_local_video_file(url: str) -> tuple[Path, int] | None:
+    """Return (path, size) if the video exists locally, with a single stat()."""
+    file_path = _local_video_candidate(url)
+    if file_path is None:
+        return None
+    try:
+        st = file_path.stat()
+    except OSError:
+        return None
+    if not stat.S_ISREG(st.st_mode):
+        return None
+    return file_path, st.st_size
+
+
+# (filename, size) → file bytes, least recently used first
+_video_bytes: OrderedDict[tuple[str, int], bytes] = OrderedDict()
+_video_bytes_total = 0
+
+
+async def _local_video_input(path: Path, size: int) -> InputFile:
+    """Input file for a local video, served from the bytes cache when small enough."""
+    global _video_bytes_total
+    if size > VIDEO_CACHE_MAX_FILE:
+        return FSInputFile(path)
+
+    key = (path.name, size)
+    data = _video_bytes.get(key)
+    if data is not None:
+        _video_bytes.move_to_end(key)
+    else:
+        data = await asyncio.to_thread(path.read_bytes)
+        _video_bytes[key] = data
+        _video_bytes_total += len(data)
+        while _video_bytes_total > VIDEO_CACHE_BYTES:
+            _, evicted = _video_bytes.popitem(last=False)
+            _video_bytes_total -= len(evicted)
+    return BufferedInputFile(data, filename=path.name)
+
+
+_LOCAL_HOSTS = frozenset({"127.0.0.1", "localhost", "0.0.0.0"})
 
 
 def _is_local_url(url: str) -> bool:
     try:
-        host = (urlparse(url).hostname or "").lower()
-    except Exception:
+        # hostname is already lower-cased and stripped of port/credentials
+        return urlsplit(url).hostname in _LOCAL_HOSTS
+    except ValueError:
         return False
-    return host in {"127.0.0.1", "localhost", "0.0.0.0"}
 
 
+@lru_cache(maxsize=256)
 def _video_settings_text(aspect: str, duration: int, resolution: str, preset: str) -> str:
     return (
         "<b>🎬 Buat Video</b>\n"
@@ -59,38 +148,34 @@ def _video_settings_text(aspect: str, duration: int, resolution: str, preset: st
     )
 
 
-async def _ensure_video_defaults(state: FSMContext) -> tuple[str, int, str, str]:
+async def _get_video_defaults(state: FSMContext) -> tuple[str, int, str, str]:
+    """Current video settings, falling back to defaults for unset keys.
+
+    Read-only: defaults are not persisted, the set_video_* handlers only
+    write the one key that changed.
+    """
     data = await state.get_data()
     aspect = data.get("vid_aspect", "9:16")
     duration = data.get("vid_duration", 6)
     resolution = data.get("vid_resolution", "480p")
     preset = data.get("vid_preset", "normal")
-    await state.update_data(
-        vid_aspect=aspect,
-        vid_duration=duration,
-        vid_resolution=resolution,
-        vid_preset=preset,
-    )
     return aspect, duration, resolution, preset
 
 
 @router.callback_query(F.data == "menu:video")
-async def open_video_menu(callback: CallbackQuery, state: FSMContext) -> None:
+async def open_video_menu(callback: CallbackQuery, state: FSMContext, user_id: int) -> None:
     await clear_state(state)
-    user_id = callback.from_user.id if callback.from_user else 0
     backend = await get_backend(state)
 
     # Gemini: no settings, go straight to prompt (landscape, 8s, fixed)
-    if backend == "gemini":
+    if _VIDEO_CONFIG.get(backend, _VIDEO_CONFIG["grok"])["fixed"]:
         admin_user = is_admin(user_id)
-        tier = await subscription_manager.get_tier(user_id)
-        allowed_cd, remaining_cd = check_cooldown(user_id, tier, is_admin=admin_user)
-        if not allowed_cd:
-            await callback.answer(f"Cooldown {remaining_cd}s", show_alert=True)
-            return
-        allowed, status = await user_limit_manager.can_consume(
+        remaining_cd, allowed, status = await user_limit_manager.preflight(
             user_id, video_units=1, is_admin_user=admin_user,
         )
+        if remaining_cd:
+            await callback.answer(f"Cooldown {remaining_cd}s", show_alert=True)
+            return
         if not allowed:
             await callback.answer("Limit video habis", show_alert=True)
             await safe_edit_text(
@@ -111,7 +196,7 @@ async def open_video_menu(callback: CallbackQuery, state: FSMContext) -> None:
         return
 
     # Grok: show settings menu
-    aspect, duration, resolution, preset = await _ensure_video_defaults(state)
+    aspect, duration, resolution, preset = await _get_video_defaults(state)
     await safe_edit_text(
         callback.message,
         _video_settings_text(aspect, duration, resolution, preset),
@@ -120,93 +205,128 @@ async def open_video_menu(callback: CallbackQuery, state: FSMContext) -> None:
     await callback.answer()
 
 
-@router.callback_query(F.data.startswith("vid:aspect:"))
-async def set_video_aspect(callback: CallbackQuery, state: FSMContext) -> None:
-    aspect = callback.data.replace("vid:aspect:", "", 1)
-    current_aspect, duration, resolution, preset = await _ensure_video_defaults(state)
-    if current_aspect == aspect:
-        await callback.answer("Aspect ratio sudah aktif")
-        return
-    await state.update_data(vid_aspect=aspect)
-    await safe_edit_text(
-        callback.message,
-        _video_settings_text(aspect, duration, resolution, preset),
-        reply_markup=video_menu_keyboard(aspect, duration, resolution, preset),
-    )
-    await callback.answer("Aspect ratio diubah")
+@lru_cache(maxsize=512)
+def _esc300(text: str) -> str:
+    """Escaped 300-char error excerpt; an outage repeats the same few errors."""
+    return html.escape(text[:300])
+
+
+@dataclass
+class _PendingSettings:
+    current: list
+    shown: tuple  # settings the message was last rendered with
+    changes: Dict[str, Any] = field(default_factory=dict)
+    message: Message | None = None
+    flush_task: asyncio.Task | None = None
+
+    def cancel(self) -> None:
+        if self.flush_task is not None:
+            self.flush_task.cancel()
+
+
+# Toggles are applied SETTINGS_DEBOUNCE seconds after the last click, so a
+# burst of clicks costs one storage write and one Telegram edit. Leaving the
+# menu (clear_state) cancels the flush: clear_state wipes the vid_* keys
+# anyway, and the flush would otherwise edit a message the user has left.
+SETTINGS_DEBOUNCE = 0.15
+_pending_settings: Dict[StorageKey, _PendingSettings] = register_state_mirror(
+    {}, on_drop=_PendingSettings.cancel,
+)
+
+# setting kind → (FSM key, position in the settings tuple, parser, label)
+_VIDEO_FIELDS = {
+    "aspect": ("vid_aspect", 0, str, "Aspect ratio"),
+    "duration": ("vid_duration", 1, int, "Duration"),
+    "resolution": ("vid_resolution", 2, str, "Resolution"),
+    "preset": ("vid_preset", 3, str, "Preset"),
+}
 
 
-@router.callback_query(F.data.startswith("vid:duration:"))
-async def set_video_duration(callback: CallbackQuery, state: FSMContext) -> None:
-    duration = int(callback.data.replace("vid:duration:", "", 1))
-    aspect, current_duration, resolution, preset = await _ensure_video_defaults(state)
-    if current_duration == duration:
-        await callback.answer("Duration sudah aktif")
+@router.callback_query(F.data.startswith("vid:") & (F.data != "vid:prompt"))
+async def set_video_setting(callback: CallbackQuery, state: FSMContext) -> None:
+    kind, _, raw = callback.data.removeprefix("vid:").partition(":")
+    spec = _VIDEO_FIELDS.get(kind)
+    if spec is None:
+        await callback.answer()
+        return
+    key, index, parse, label = spec
+    try:
+        value = parse(raw)
+    except ValueError:
+        await callback.answer()
+        return
+
+    pending = _pending_settings.get(state.key)
+    if pending is None:
+        current = list(await _get_video_defaults(state))
+        # a concurrent tap may have created the entry during the await
+        pending = _pending_settings.setdefault(
+            state.key, _PendingSettings(current=current, shown=tuple(current)),
+        )
+    if pending.current[index] == value:
+        await callback.answer(f"{label} sudah aktif")
         return
-    await state.update_data(vid_duration=duration)
-    await safe_edit_text(
-        callback.message,
-        _video_settings_text(aspect, duration, resolution, preset),
-        reply_markup=video_menu_keyboard(aspect, duration, resolution, preset),
-    )
-    await callback.answer("Duration diubah")
 
+    pending.current[index] = value
+    pending.changes[key] = value
+    pending.message = callback.message
+    pending.cancel()
+    pending.flush_task = asyncio.create_task(_flush_video_settings(state, pending))
+    await callback.answer(f"{label} diubah")
 
-@router.callback_query(F.data.startswith("vid:resolution:"))
-async def set_video_resolution(callback: CallbackQuery, state: FSMContext) -> None:
-    resolution = callback.data.replace("vid:resolution:", "", 1)
-    aspect, duration, current_resolution, preset = await _ensure_video_defaults(state)
-    if current_resolution == resolution:
-        await callback.answer("Resolution sudah aktif")
+
+async def _apply_pending_settings(state: FSMContext) -> None:
+    """Store unflushed toggles now, without the keyboard edit (user moved on)."""
+    pending = _pending_settings.pop(state.key, None)
+    if pending is None:
         return
-    await state.update_data(vid_resolution=resolution)
-    await safe_edit_text(
-        callback.message,
-        _video_settings_text(aspect, duration, resolution, preset),
-        reply_markup=video_menu_keyboard(aspect, duration, resolution, preset),
-    )
-    await callback.answer("Resolution diubah")
+    pending.cancel()
+    await state.update_data(pending.changes)
 
 
-@router.callback_query(F.data.startswith("vid:preset:"))
-async def set_video_preset(callback: CallbackQuery, state: FSMContext) -> None:
-    preset = callback.data.replace("vid:preset:", "", 1)
-    aspect, duration, resolution, current_preset = await _ensure_video_defaults(state)
-    if current_preset == preset:
-        await callback.answer("Preset sudah aktif")
+async def _flush_video_settings(state: FSMContext, pending: _PendingSettings) -> None:
+    """Write a burst of setting toggles with one FSM update and one edit."""
+    await asyncio.sleep(SETTINGS_DEBOUNCE)
+    # only flush the entry this task was scheduled for, never a newer one
+    if _pending_settings.get(state.key) is not pending:
         return
-    await state.update_data(vid_preset=preset)
-    await safe_edit_text(
-        callback.message,
-        _video_settings_text(aspect, duration, resolution, preset),
-        reply_markup=video_menu_keyboard(aspect, duration, resolution, preset),
-    )
-    await callback.answer("Preset diubah")
+    del _pending_settings[state.key]
+    try:
+        await state.update_data(pending.changes)
+        text = _video_settings_text(*pending.current)
+        markup = video_menu_keyboard(*pending.current)
+        if text == _video_settings_text(*pending.shown):
+            await safe_edit_reply_markup(pending.message, markup)
+        else:
+            await safe_edit_text(pending.message, text, reply_markup=markup)
+    except Exception:
+        logger.exception("[Video] Failed to apply settings %s", pending.changes)
 
 
 @router.callback_query(F.data == "vid:prompt")
-async def ask_video_prompt(callback: CallbackQuery, state: FSMContext) -> None:
-    user_id = callback.from_user.id if callback.from_user else 0
+async def ask_video_prompt(callback: CallbackQuery, state: FSMContext, user_id: int) -> None:
     admin_user = is_admin(user_id)
-
-    # Rate limit check
-    tier = await subscription_manager.get_tier(user_id)
-    allowed_cd, remaining_cd = check_cooldown(user_id, tier, is_admin=admin_user)
-    if not allowed_cd:
+    await _apply_pending_settings(state)
+
+    # Rate limit + quota check, alongside the FSM read
+    (remaining_cd, allowed, status), backend = await asyncio.gather(
+        user_limit_manager.preflight(
+            user_id,
+            video_units=1,
+            is_admin_user=admin_user,
+        ),
+        get_backend(state),
+    )
+    if remaining_cd:
         await callback.answer(f"Cooldown {remaining_cd}s", show_alert=True)
         return
 
-    allowed, status = await user_limit_manager.can_consume(
-        user_id,
-        video_units=1,
-        is_admin_user=admin_user,
-    )
     if not allowed:
         await callback.answer("Limit video habis", show_alert=True)
         await safe_edit_text(
             callback.message,
             f"Limit video habis. Sisa: <b>{status['videos_remaining']}</b>",
-            reply_markup=main_menu_keyboard(await get_backend(state)),
+            reply_markup=main_menu_keyboard(backend),
         )
         return
 
@@ -219,43 +339,90 @@ async def ask_video_prompt(callback: CallbackQuery, state: FSMContext) -> None:
     await callback.answer()
 
 
+async def _safe_delete(msg: Message) -> None:
+    try:
+        await msg.delete()
+    except Exception:
+        pass
+
+
+async def _deliver_video(message: Message, video_url: str) -> bool:
+    """Send the video as an upload when it's local, else by URL. True if sent."""
+    local = _resolve_local_video_file(video_url)
+    if local and local[1] <= UPLOAD_SIZE_LIMIT:
+        # One input file serves both attempts; the file is read at most once.
+        try:
+            local_file = await _local_video_input(*local)
+        except OSError:
+            local_file = None
+        if local_file is not None:
+            try:
+                await message.answer_video(video=local_file)
+                return True
+            except Exception:
+                pass
+            try:
+                await message.answer_document(document=local_file)
+                return True
+            except Exception:
+                pass
+    if not _is_local_url(video_url):
+        try:
+            await message.answer_video(video=video_url)
+            return True
+        except Exception:
+            pass
+    return False
+
+
 @router.message(VideoFlow.waiting_prompt)
-async def handle_video_prompt(message: Message, state: FSMContext) -> None:
+async def handle_video_prompt(message: Message, state: FSMContext, user_id: int) -> None:
     prompt = (message.text or "").strip()
     if not prompt:
         await message.answer("Prompt tidak boleh kosong. Kirim ulang.")
         return
 
-    user_id = message.from_user.id if message.from_user else 0
     admin_user = is_admin(user_id)
-    allowed, status = await user_limit_manager.can_consume(
-        user_id,
-        video_units=1,
-        is_admin_user=admin_user,
+    # One FSM read (clear_state() keeps "backend", so it stays valid below),
+    # concurrent with taking the quota. Reserving up front means
+    # double-submits can't both pass; refunded below unless the video is
+    # actually delivered.
+    data, reserved = await asyncio.gather(
+        state.get_data(),
+        user_limit_manager.reserve(
+            user_id,
+            video_units=1,
+            is_admin_user=admin_user,
+        ),
     )
-    if not allowed:
-        await clear_state(state)
+    backend = data.get("backend", "grok")
+    if reserved is None:
+        status, _ = await asyncio.gather(
+            user_limit_manager.get_status(user_id),
+            clear_state(state),
+        )
         await message.answer(
             f"Limit video habis. Sisa: {status['videos_remaining']}"
         )
-        await message.answer(HOME_TEXT, reply_markup=main_menu_keyboard(await get_backend(state)))
+        await message.answer(HOME_TEXT, reply_markup=main_menu_keyboard(backend))
         return
 
-    aspect, duration, resolution, preset = await _ensure_video_defaults(state)
+    cfg = _VIDEO_CONFIG.get(backend, _VIDEO_CONFIG["grok"])
+    model = cfg["model"]
+    if cfg["fixed"]:
+        aspect, duration, resolution, preset = cfg["fixed"]
+    else:
+        aspect = data.get("vid_aspect", "9:16")
+        duration = data.get("vid_duration", 6)
+        resolution = data.get("vid_resolution", "480p")
+        preset = data.get("vid_preset", "normal")
     wait_msg = await message.answer("⏳ Generating video…")
 
-    data = await state.get_data()
-    backend = data.get("backend", "grok")
-    model = BACKEND_VIDEO_MODEL.get(backend, "grok-2-video")
-
-    # Gemini: override to fixed landscape 8s
-    if backend == "gemini":
-        aspect = "16:9"
-        duration = 8
-        resolution = "720p"
-        preset = "normal"
-
+    global _cf_blocked_until
+    delivered = False
     try:
+        if time.monotonic() < _cf_blocked_until:
+            raise _CloudflareBlocked("403 Cloudflare block still active, gateway not called")
         payload = await gateway_client.generate_video(
             prompt=prompt,
             aspect_ratio=aspect,
@@ -264,76 +431,49 @@ async def handle_video_prompt(message: Message, state: FSMContext) -> None:
             preset=preset,
             model=model,
         )
-        data = payload.get("data", [])
-        item = data[0] if data else {}
+        items = payload.get("data", [])
+        item = items[0] if items else {}
         video_url = item.get("video_url") or item.get("url")
 
         if not video_url:
             await wait_msg.edit_text("Gagal — video URL tidak ditemukan.")
         else:
-            try:
-                await wait_msg.delete()
-            except Exception:
-                pass
-            sent = False
-            local_path = _resolve_local_video_path(video_url)
-            if local_path:
-                try:
-                    await message.answer_video(video=FSInputFile(str(local_path)))
-                    sent = True
-                except Exception:
-                    sent = False
-                if not sent:
-                    try:
-                        await message.answer_document(document=FSInputFile(str(local_path)))
-                        sent = True
-                    except Exception:
-                        sent = False
+            # Independent Telegram calls: drop the progress message while
+            # the upload is in flight.
+            _, sent = await asyncio.gather(
+                _safe_delete(wait_msg),
+                _deliver_video(message, video_url),
+            )
             if sent:
-                await user_limit_manager.consume(
-                    user_id,
-                    video_units=1,
-                    is_admin_user=admin_user,
-                )
+                delivered = True
                 record_request(user_id)
-                await clear_state(state)
-                await message.answer(HOME_TEXT, reply_markup=main_menu_keyboard(await get_backend(state)))
-                return
-            if not _is_local_url(video_url):
-                try:
-                    await message.answer_video(video=video_url)
-                    sent = True
-                except Exception:
-                    sent = False
-            if not sent:
-                await message.answer(video_url)
             else:
-                await user_limit_manager.consume(
-                    user_id,
-                    video_units=1,
-                    is_admin_user=admin_user,
-                )
-                record_request(user_id)
+                await message.answer(video_url)
     except Exception as exc:
-        exc_str = str(exc)
-        if "403" in exc_str and ("Just a moment" in exc_str or "DOCTYPE" in exc_str or "Cloudflare" in exc_str):
+        exc_str = str(exc)[:4096]
+        found = {m.lastgroup for m in _ERR_RE.finditer(exc_str)}
+        if "forbidden" in found and "cf" in found:
+            if not isinstance(exc, _CloudflareBlocked):
+                _cf_blocked_until = time.monotonic() + CF_BLOCK_COOLDOWN
             err_msg = (
                 "<b>Cloudflare Block (403)</b>\n\n"
                 "IP server berbeda dari IP saat mengambil "
                 "<code>CF_CLEARANCE</code>.\n"
                 "Update <code>CF_CLEARANCE</code> di <code>.env</code>."
             )
-        elif "rate_limit" in exc_str or "429" in exc_str:
+        elif "rate" in found:
             err_msg = "<b>Rate limit</b> — SSO key mencapai batas. Coba lagi nanti."
-        elif "401" in exc_str or "unauthorized" in exc_str.lower():
+        elif "auth" in found:
             err_msg = "<b>Unauthorized</b> — SSO token invalid/expired."
         else:
-            short = html.escape(exc_str[:300])
-            err_msg = f"Generate gagal:\n<code>{short}</code>"
+            err_msg = f"Generate gagal:\n<code>{_esc300(exc_str)}</code>"
         try:
             await wait_msg.edit_text(err_msg)
         except Exception:
             await wait_msg.edit_text("Generate gagal.")
+    finally:
+        if not delivered:
+            await user_limit_manager.refund(user_id, reserved)
 
     await clear_state(state)
-    await message.answer(HOME_TEXT, reply_markup=main_menu_keyboard(await get_backend(state)))
+    await message.answer(HOME_TEXT, reply_markup=main_menu_keyboard(backend))
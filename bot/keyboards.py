@@ -1,5 +1,24 @@
+from functools import lru_cache
+
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 
+from .callbacks import PayCB
+from .ui import format_rp
+
+# Buttons and markups here are built from literals and our own callback data,
+# so pydantic validation is skipped; aiogram serializes them the same way.
+_Btn = InlineKeyboardButton.model_construct
+_Markup = InlineKeyboardMarkup.model_construct
+
+# Buttons repeated across keyboards, shared rather than rebuilt per keyboard
+_BACK_HOME = _Btn(text="← Kembali", callback_data="menu:home")
+_BACK_ADMIN = _Btn(text="← Admin", callback_data="menu:admin")
+_BACK_SUBS = _Btn(text="← Kembali", callback_data="menu:subs")
+_BACK_PAY_BUY = _Btn(text="← Kembali", callback_data="pay:buy")
+_CANCEL_SUBS = _Btn(text="✕ Batal", callback_data="menu:subs")
+_CANCEL_GEM_ADD = _Btn(text="✕ Batal", callback_data="gem:add:cancel")
+_HDR_RASIO = _Btn(text="── Rasio ──", callback_data="noop")
+
 # Backend display labels
 BACKEND_LABELS = {
     "grok": "Grok",
@@ -12,120 +31,145 @@ BACKEND_ICONS = {
 }
 
 
+# Keyboard factories are memoized (lru_cache or module-level markups): callers
+# share the returned markup and must not mutate it.
+@lru_cache(maxsize=8)
 def main_menu_keyboard(backend: str = "grok") -> InlineKeyboardMarkup:
     icon = BACKEND_ICONS.get(backend, "")
     label = BACKEND_LABELS.get(backend, backend)
-    return InlineKeyboardMarkup(
+    return _Markup(
         inline_keyboard=[
             [
-                InlineKeyboardButton(text="🖼 Image", callback_data="menu:image"),
-                InlineKeyboardButton(text="🎬 Video", callback_data="menu:video"),
+                _Btn(text="🖼 Image", callback_data="menu:image"),
+                _Btn(text="🎬 Video", callback_data="menu:video"),
             ],
             [
-                InlineKeyboardButton(text="💎 Langganan", callback_data="menu:subs"),
-                InlineKeyboardButton(text="📊 Kuota", callback_data="menu:limit"),
+                _Btn(text="💎 Langganan", callback_data="menu:subs"),
+                _Btn(text="📊 Kuota", callback_data="menu:limit"),
             ],
             [
-                InlineKeyboardButton(text="📦 Topup", callback_data="menu:topup"),
-                InlineKeyboardButton(text="🏆 Ranking", callback_data="menu:leaderboard"),
+                _Btn(text="📦 Topup", callback_data="menu:topup"),
+                _Btn(text="🏆 Ranking", callback_data="menu:leaderboard"),
             ],
             [
-                InlineKeyboardButton(text="🔗 Referral", callback_data="menu:referral"),
-                InlineKeyboardButton(text=f"{icon} {label}", callback_data="menu:backend"),
+                _Btn(text="🔗 Referral", callback_data="menu:referral"),
+                _Btn(text=f"{icon} {label}", callback_data="menu:backend"),
             ],
         ]
     )
 
 
+_REFERRAL_KB = _Markup(
+    inline_keyboard=[
+        [_Btn(text="↻ Refresh", callback_data="menu:referral")],
+        [_BACK_HOME],
+    ]
+)
+
+
 def referral_keyboard() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
-        inline_keyboard=[
-            [InlineKeyboardButton(text="↻ Refresh", callback_data="menu:referral")],
-            [InlineKeyboardButton(text="← Kembali", callback_data="menu:home")],
-        ]
-    )
+    return _REFERRAL_KB
+
+
+# ---------------------------------------------------------------------------
+# Option toggles
+# ---------------------------------------------------------------------------
+
+def _toggle_table(prefix: str, options) -> dict:
+    """value → (unselected button, selected button), built once at import."""
+    return {
+        value: tuple(
+            _Btn(text=f"{mark}{label}", callback_data=f"{prefix}:{value}")
+            for mark in ("○ ", "● ")
+        )
+        for value, label in options
+    }
+
+
+def _toggle_row(table: dict, values, selected) -> list:
+    return [table[v][v == selected] for v in values]
+
+
+def _selection_rows(table: dict, values) -> dict:
+    """selected value → finished row, for fixed groups; key None = nothing selected."""
+    rows = {sel: _toggle_row(table, values, sel) for sel in values}
+    rows[None] = _toggle_row(table, values, None)
+    return rows
+
+
+def _row_for(rows: dict, selected) -> list:
+    return rows.get(selected, rows[None])
+
+
+_IMG_ASPECTS = _toggle_table(
+    "img:aspect", [(a, a) for a in ("1:1", "2:3", "3:2", "9:16", "16:9")]
+)
+# Covers every tier's max_images_per_request
+_IMG_COUNTS = _toggle_table("img:n", [(i, str(i)) for i in range(1, 11)])
 
+_VID_ASPECTS = _toggle_table("vid:aspect", [(a, a) for a in ("9:16", "16:9", "1:1")])
+_VID_DURATIONS = _toggle_table("vid:duration", [(6, "6 detik"), (10, "10 detik")])
+_VID_RESOLUTIONS = _toggle_table("vid:resolution", [(r, r) for r in ("480p", "720p")])
+_VID_PRESETS = _toggle_table(
+    "vid:preset",
+    [("normal", "Normal"), ("fun", "Fun"), ("spicy", "Spicy"), ("custom", "Custom")],
+)
 
+_BACKENDS = _toggle_table("backend", [("grok", "⚡ Grok"), ("gemini", "✦ Gemini")])
+
+# Whole rows for the fixed option groups
+_IMG_ASPECT_ROWS_1 = _selection_rows(_IMG_ASPECTS, ("1:1", "2:3", "3:2"))
+_IMG_ASPECT_ROWS_2 = _selection_rows(_IMG_ASPECTS, ("9:16", "16:9"))
+_VID_ASPECT_ROWS = _selection_rows(_VID_ASPECTS, ("9:16", "16:9", "1:1"))
+_VID_DURATION_ROWS = _selection_rows(_VID_DURATIONS, (6, 10))
+_VID_RESOLUTION_ROWS = _selection_rows(_VID_RESOLUTIONS, ("480p", "720p"))
+_VID_PRESET_ROWS_1 = _selection_rows(_VID_PRESETS, ("normal", "fun"))
+_VID_PRESET_ROWS_2 = _selection_rows(_VID_PRESETS, ("spicy", "custom"))
+_BACKEND_ROWS = _selection_rows(_BACKENDS, ("grok", "gemini"))
+
+
+@lru_cache(maxsize=512)
 def backend_select_keyboard(current: str = "grok") -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
+    return _Markup(
         inline_keyboard=[
-            [
-                InlineKeyboardButton(
-                    text=f"{'● ' if current == 'grok' else '○ '}⚡ Grok",
-                    callback_data="backend:grok",
-                ),
-                InlineKeyboardButton(
-                    text=f"{'● ' if current == 'gemini' else '○ '}✦ Gemini",
-                    callback_data="backend:gemini",
-                ),
-            ],
-            [InlineKeyboardButton(text="← Kembali", callback_data="menu:home")],
+            _row_for(_BACKEND_ROWS, current),
+            [_BACK_HOME],
         ]
     )
 
 
+@lru_cache(maxsize=512)
 def image_menu_keyboard(selected_aspect: str, selected_n: int, max_n: int = 4, max_batch: int = 1) -> InlineKeyboardMarkup:
-    n_buttons = [
-        InlineKeyboardButton(
-            text=f"{'● ' if selected_n == i else '○ '}{i}",
-            callback_data=f"img:n:{i}",
-        )
-        for i in range(1, max_n + 1)
-    ]
-
-    rows = [
-        [InlineKeyboardButton(text="── Rasio ──", callback_data="noop")],
-        [
-            InlineKeyboardButton(text=f"{'● ' if selected_aspect == '1:1' else '○ '}1:1", callback_data="img:aspect:1:1"),
-            InlineKeyboardButton(text=f"{'● ' if selected_aspect == '2:3' else '○ '}2:3", callback_data="img:aspect:2:3"),
-            InlineKeyboardButton(text=f"{'● ' if selected_aspect == '3:2' else '○ '}3:2", callback_data="img:aspect:3:2"),
-        ],
-        [
-            InlineKeyboardButton(text=f"{'● ' if selected_aspect == '9:16' else '○ '}9:16", callback_data="img:aspect:9:16"),
-            InlineKeyboardButton(text=f"{'● ' if selected_aspect == '16:9' else '○ '}16:9", callback_data="img:aspect:16:9"),
-        ],
-        [InlineKeyboardButton(text="── Jumlah ──", callback_data="noop")],
-        n_buttons,
-        [InlineKeyboardButton(text="✏️ Tulis Prompt", callback_data="img:prompt")],
-    ]
-
-    if max_batch > 1:
-        rows.append([InlineKeyboardButton(text=f"📝 Batch ({max_batch} prompt)", callback_data="img:batch")])
-
-    rows.append([InlineKeyboardButton(text="← Kembali", callback_data="menu:home")])
-    return InlineKeyboardMarkup(inline_keyboard=rows)
+    batch = [[_Btn(text=f"📝 Batch ({max_batch} prompt)", callback_data="img:batch")]] if max_batch > 1 else []
+    return _Markup(
+        inline_keyboard=[
+            [_HDR_RASIO],
+            _row_for(_IMG_ASPECT_ROWS_1, selected_aspect),
+            _row_for(_IMG_ASPECT_ROWS_2, selected_aspect),
+            [_Btn(text="── Jumlah ──", callback_data="noop")],
+            _toggle_row(_IMG_COUNTS, range(1, max_n + 1), selected_n),
+            [_Btn(text="✏️ Tulis Prompt", callback_data="img:prompt")],
+            *batch,
+            [_BACK_HOME],
+        ]
+    )
 
 
+@lru_cache(maxsize=256)
 def video_menu_keyboard(aspect: str, duration: int, resolution: str, preset: str) -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
+    return _Markup(
         inline_keyboard=[
-            [InlineKeyboardButton(text="── Rasio ──", callback_data="noop")],
-            [
-                InlineKeyboardButton(text=f"{'● ' if aspect == '9:16' else '○ '}9:16", callback_data="vid:aspect:9:16"),
-                InlineKeyboardButton(text=f"{'● ' if aspect == '16:9' else '○ '}16:9", callback_data="vid:aspect:16:9"),
-                InlineKeyboardButton(text=f"{'● ' if aspect == '1:1' else '○ '}1:1", callback_data="vid:aspect:1:1"),
-            ],
-            [InlineKeyboardButton(text="── Durasi ──", callback_data="noop")],
-            [
-                InlineKeyboardButton(text=f"{'● ' if duration == 6 else '○ '}6 detik", callback_data="vid:duration:6"),
-                InlineKeyboardButton(text=f"{'● ' if duration == 10 else '○ '}10 detik", callback_data="vid:duration:10"),
-            ],
-            [InlineKeyboardButton(text="── Resolusi ──", callback_data="noop")],
-            [
-                InlineKeyboardButton(text=f"{'● ' if resolution == '480p' else '○ '}480p", callback_data="vid:resolution:480p"),
-                InlineKeyboardButton(text=f"{'● ' if resolution == '720p' else '○ '}720p", callback_data="vid:resolution:720p"),
-            ],
-            [InlineKeyboardButton(text="── Preset ──", callback_data="noop")],
-            [
-                InlineKeyboardButton(text=f"{'● ' if preset == 'normal' else '○ '}Normal", callback_data="vid:preset:normal"),
-                InlineKeyboardButton(text=f"{'● ' if preset == 'fun' else '○ '}Fun", callback_data="vid:preset:fun"),
-            ],
-            [
-                InlineKeyboardButton(text=f"{'● ' if preset == 'spicy' else '○ '}Spicy", callback_data="vid:preset:spicy"),
-                InlineKeyboardButton(text=f"{'● ' if preset == 'custom' else '○ '}Custom", callback_data="vid:preset:custom"),
-            ],
-            [InlineKeyboardButton(text="✏️ Tulis Prompt", callback_data="vid:prompt")],
-            [InlineKeyboardButton(text="← Kembali", callback_data="menu:home")],
+            [_HDR_RASIO],
+            _row_for(_VID_ASPECT_ROWS, aspect),
+            [_Btn(text="── Durasi ──", callback_data="noop")],
+            _row_for(_VID_DURATION_ROWS, duration),
+            [_Btn(text="── Resolusi ──", callback_data="noop")],
+            _row_for(_VID_RESOLUTION_ROWS, resolution),
+            [_Btn(text="── Preset ──", callback_data="noop")],
+            _row_for(_VID_PRESET_ROWS_1, preset),
+            _row_for(_VID_PRESET_ROWS_2, preset),
+            [_Btn(text="✏️ Tulis Prompt", callback_data="vid:prompt")],
+            [_BACK_HOME],
         ]
     )
 
@@ -134,68 +178,74 @@ def video_menu_keyboard(aspect: str, duration: int, resolution: str, preset: str
 # Admin keyboards
 # ---------------------------------------------------------------------------
 
+_ADMIN_MENU_KB = _Markup(
+    inline_keyboard=[
+        [
+            _Btn(text="👥 Users", callback_data="adm:users"),
+            _Btn(text="💎 Subs", callback_data="adm:subs"),
+        ],
+        [
+            _Btn(text="📢 Broadcast", callback_data="adm:broadcast"),
+            _Btn(text="📊 Stats", callback_data="adm:stats"),
+        ],
+        [
+            _Btn(text="🖼 Images", callback_data="admin:images"),
+            _Btn(text="🎬 Videos", callback_data="admin:videos"),
+        ],
+        [
+            _Btn(text="📡 Gateway", callback_data="admin:status"),
+            _Btn(text="🔑 SSO", callback_data="admin:reload_sso"),
+        ],
+        [
+            _Btn(text="✦ Gemini", callback_data="menu:gemini"),
+            _Btn(text="➕ SSO Key", callback_data="admin:add_key"),
+        ],
+        [_BACK_HOME],
+    ]
+)
+
+
 def admin_menu_keyboard() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
-        inline_keyboard=[
-            [
-                InlineKeyboardButton(text="👥 Users", callback_data="adm:users"),
-                InlineKeyboardButton(text="💎 Subs", callback_data="adm:subs"),
-            ],
-            [
-                InlineKeyboardButton(text="📢 Broadcast", callback_data="adm:broadcast"),
-                InlineKeyboardButton(text="📊 Stats", callback_data="adm:stats"),
-            ],
-            [
-                InlineKeyboardButton(text="🖼 Images", callback_data="admin:images"),
-                InlineKeyboardButton(text="🎬 Videos", callback_data="admin:videos"),
-            ],
-            [
-                InlineKeyboardButton(text="📡 Gateway", callback_data="admin:status"),
-                InlineKeyboardButton(text="🔑 SSO", callback_data="admin:reload_sso"),
-            ],
-            [
-                InlineKeyboardButton(text="✦ Gemini", callback_data="menu:gemini"),
-                InlineKeyboardButton(text="➕ SSO Key", callback_data="admin:add_key"),
-            ],
-            [InlineKeyboardButton(text="← Kembali", callback_data="menu:home")],
-        ]
-    )
+    return _ADMIN_MENU_KB
 
 
+@lru_cache(maxsize=64)
 def media_list_keyboard(media_type: str, items_count: int) -> InlineKeyboardMarkup:
     rows = [
-        [InlineKeyboardButton(text=f"✕ #{idx + 1}", callback_data=f"admin:delete:{media_type}:{idx}")]
+        [_Btn(text=f"✕ #{idx + 1}", callback_data=f"admin:delete:{media_type}:{idx}")]
         for idx in range(items_count)
     ]
-    rows.append([InlineKeyboardButton(text="↻ Refresh", callback_data=f"admin:{media_type}")])
-    rows.append([InlineKeyboardButton(text="← Admin", callback_data="menu:admin")])
-    return InlineKeyboardMarkup(inline_keyboard=rows)
+    rows += ([_Btn(text="↻ Refresh", callback_data=f"admin:{media_type}")], [_BACK_ADMIN])
+    return _Markup(inline_keyboard=rows)
 
 
-def media_page_keyboard(media_type: str, start: int, end: int, total: int) -> InlineKeyboardMarkup:
+@lru_cache(maxsize=512)
+def media_page_keyboard(media_type: str, start: int, end: int, total: int, page_size: int) -> InlineKeyboardMarkup:
     rows = [
-        [InlineKeyboardButton(text=f"✕ #{idx + 1}", callback_data=f"admin:deleteask:{media_type}:{idx}")]
+        [_Btn(text=f"✕ #{idx + 1}", callback_data=f"admin:deleteask:{media_type}:{idx}")]
         for idx in range(start, end)
     ]
     nav = []
     if start > 0:
-        prev_start = max(0, start - (end - start))
-        nav.append(InlineKeyboardButton(text="◂ Prev", callback_data=f"admin:page:{media_type}:{prev_start}"))
+        # page_size, not end - start: the last page can be short
+        prev_start = start - page_size if start >= page_size else 0
+        nav.append(_Btn(text="◂ Prev", callback_data=f"admin:page:{media_type}:{prev_start}"))
     if end < total:
-        nav.append(InlineKeyboardButton(text="Next ▸", callback_data=f"admin:page:{media_type}:{end}"))
+        nav.append(_Btn(text="Next ▸", callback_data=f"admin:page:{media_type}:{end}"))
     if nav:
         rows.append(nav)
-    rows.append([InlineKeyboardButton(text="↻ Refresh", callback_data=f"admin:{media_type}")])
-    rows.append([InlineKeyboardButton(text="← Admin", callback_data="menu:admin")])
-    return InlineKeyboardMarkup(inline_keyboard=rows)
+    rows.append([_Btn(text="↻ Refresh", callback_data=f"admin:{media_type}")])
+    rows.append([_BACK_ADMIN])
+    return _Markup(inline_keyboard=rows)
 
 
+@lru_cache(maxsize=512)
 def delete_confirm_keyboard(media_type: str, idx: int, back_start: int) -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
+    return _Markup(
         inline_keyboard=[
             [
-                InlineKeyboardButton(text="Ya, Hapus", callback_data=f"admin:deleteok:{media_type}:{idx}"),
-                InlineKeyboardButton(text="Batal", callback_data=f"admin:page:{media_type}:{back_start}"),
+                _Btn(text="Ya, Hapus", callback_data=f"admin:deleteok:{media_type}:{idx}"),
+                _Btn(text="Batal", callback_data=f"admin:page:{media_type}:{back_start}"),
             ]
         ]
     )
@@ -205,140 +255,183 @@ def delete_confirm_keyboard(media_type: str, idx: int, back_start: int) -> Inlin
 # SSO keyboards
 # ---------------------------------------------------------------------------
 
+# Keyboards without per-user state are built once and shared; aiogram only
+# serializes the markup, it never mutates it.
+_SSO_MENU_KB = _Markup(
+    inline_keyboard=[
+        [
+            _Btn(text="➕ Tambah", callback_data="sso:add"),
+            _Btn(text="📋 List", callback_data="sso:list"),
+        ],
+        [
+            _Btn(text="✕ Hapus Terakhir", callback_data="sso:remove_last"),
+            _Btn(text="↻ Reload", callback_data="sso:reload"),
+        ],
+        [_BACK_HOME],
+    ]
+)
+
+
 def sso_menu_keyboard() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
-        inline_keyboard=[
-            [
-                InlineKeyboardButton(text="➕ Tambah", callback_data="sso:add"),
-                InlineKeyboardButton(text="📋 List", callback_data="sso:list"),
-            ],
-            [
-                InlineKeyboardButton(text="✕ Hapus Terakhir", callback_data="sso:remove_last"),
-                InlineKeyboardButton(text="↻ Reload", callback_data="sso:reload"),
-            ],
-            [InlineKeyboardButton(text="← Kembali", callback_data="menu:home")],
-        ]
-    )
+    return _SSO_MENU_KB
+
+
+_SSO_ADD_INPUT_KB = _Markup(
+    inline_keyboard=[
+        [_Btn(text="✕ Batal", callback_data="sso:add:cancel")],
+    ]
+)
 
 
 def sso_add_input_keyboard() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
-        inline_keyboard=[
-            [InlineKeyboardButton(text="✕ Batal", callback_data="sso:add:cancel")],
-        ]
-    )
+    return _SSO_ADD_INPUT_KB
 
 
 # ---------------------------------------------------------------------------
 # Gemini keyboards
 # ---------------------------------------------------------------------------
 
+_GEMINI_MENU_EMPTY = ([_Btn(text="📋 Status Server", callback_data="gem:list")],)
+_GEMINI_MENU_TAIL = (
+    [
+        _Btn(text="➕ Manual", callback_data="gem:add"),
+        _Btn(text="⚡ Auto-Register", callback_data="gem:autoreg"),
+    ],
+    [
+        _Btn(text="↻ Reload", callback_data="gem:reload"),
+        _Btn(text="🔍 Health", callback_data="gem:health"),
+    ],
+    [_BACK_ADMIN],
+)
+
+
 def gemini_menu_keyboard(server_data: list | None = None) -> InlineKeyboardMarkup:
     """Gemini manager menu with server status."""
-    rows = []
+    if not server_data:
+        return _Markup(inline_keyboard=[*_GEMINI_MENU_EMPTY, *_GEMINI_MENU_TAIL])
+    return _Markup(
+        inline_keyboard=[
+            *(
+                [
+                    _Btn(text=srv["label"], callback_data=f"gem:info:{srv['index']}"),
+                    _Btn(text="✕", callback_data=f"gem:rm:{srv['index']}"),
+                ]
+                for srv in server_data
+            ),
+            *_GEMINI_MENU_TAIL,
+        ]
+    )
 
-    if server_data:
-        for srv in server_data:
-            idx = srv["index"]
-            label = srv["label"]
-            rows.append([
-                InlineKeyboardButton(text=label, callback_data=f"gem:info:{idx}"),
-                InlineKeyboardButton(text="✕", callback_data=f"gem:rm:{idx}"),
-            ])
-    else:
-        rows.append([InlineKeyboardButton(text="📋 Status Server", callback_data="gem:list")])
-
-    rows.extend([
-        [
-            InlineKeyboardButton(text="➕ Manual", callback_data="gem:add"),
-            InlineKeyboardButton(text="⚡ Auto-Register", callback_data="gem:autoreg"),
-        ],
-        [
-            InlineKeyboardButton(text="↻ Reload", callback_data="gem:reload"),
-            InlineKeyboardButton(text="🔍 Health", callback_data="gem:health"),
-        ],
-        [InlineKeyboardButton(text="← Admin", callback_data="menu:admin")],
-    ])
-    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+_GEMINI_INPUT_KB = _Markup(
+    inline_keyboard=[
+        [_CANCEL_GEM_ADD],
+    ]
+)
 
 
 def gemini_input_keyboard() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
-        inline_keyboard=[
-            [InlineKeyboardButton(text="✕ Batal", callback_data="gem:add:cancel")],
-        ]
-    )
+    return _GEMINI_INPUT_KB
+
+
+_GEMINI_SKIP_KB = _Markup(
+    inline_keyboard=[
+        [
+            _Btn(text="» Skip", callback_data="gem:skip"),
+            _CANCEL_GEM_ADD,
+        ],
+    ]
+)
 
 
 def gemini_skip_keyboard() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
-        inline_keyboard=[
-            [
-                InlineKeyboardButton(text="» Skip", callback_data="gem:skip"),
-                InlineKeyboardButton(text="✕ Batal", callback_data="gem:add:cancel"),
-            ],
-        ]
-    )
+    return _GEMINI_SKIP_KB
 
 
 # ---------------------------------------------------------------------------
 # Subscription keyboards
 # ---------------------------------------------------------------------------
 
+# Rows shared by the user and admin subscription menus
+_SUBSCRIPTION_USER_ROWS = [
+    [
+        _Btn(text="📋 Info", callback_data="subs:info"),
+        _Btn(text="📊 Tiers", callback_data="subs:tiers"),
+    ],
+    [_Btn(text="🛒 Beli Langganan", callback_data="pay:buy")],
+    [_Btn(text="📜 Riwayat", callback_data="pay:history")],
+]
+
+_SUBSCRIPTION_MENU_KB = _Markup(
+    inline_keyboard=[
+        *_SUBSCRIPTION_USER_ROWS,
+        [_BACK_HOME],
+    ]
+)
+
+
 def subscription_menu_keyboard() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
-        inline_keyboard=[
-            [
-                InlineKeyboardButton(text="📋 Info", callback_data="subs:info"),
-                InlineKeyboardButton(text="📊 Tiers", callback_data="subs:tiers"),
-            ],
-            [InlineKeyboardButton(text="🛒 Beli Langganan", callback_data="pay:buy")],
-            [InlineKeyboardButton(text="📜 Riwayat", callback_data="pay:history")],
-            [InlineKeyboardButton(text="← Kembali", callback_data="menu:home")],
-        ]
-    )
+    return _SUBSCRIPTION_MENU_KB
+
+
+_SUBSCRIPTION_ADMIN_KB = _Markup(
+    inline_keyboard=[
+        *_SUBSCRIPTION_USER_ROWS,
+        [
+            _Btn(text="➕ Grant", callback_data="subs:grant"),
+            _Btn(text="✕ Revoke", callback_data="subs:revoke"),
+        ],
+        [_Btn(text="📃 Active Subs", callback_data="subs:list")],
+        [_BACK_HOME],
+    ]
+)
 
 
 def subscription_admin_keyboard() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
+    return _SUBSCRIPTION_ADMIN_KB
+
+
+@lru_cache(maxsize=512)
+def subs_list_keyboard(page: int, total_pages: int) -> InlineKeyboardMarkup:
+    nav = []
+    if page > 0:
+        nav.append(_Btn(text="◂ Prev", callback_data=f"subs:list:p:{page - 1}"))
+    nav.append(_Btn(text=f"{page + 1}/{total_pages}", callback_data="noop"))
+    if page < total_pages - 1:
+        nav.append(_Btn(text="Next ▸", callback_data=f"subs:list:p:{page + 1}"))
+    return _Markup(
         inline_keyboard=[
-            [
-                InlineKeyboardButton(text="📋 Info", callback_data="subs:info"),
-                InlineKeyboardButton(text="📊 Tiers", callback_data="subs:tiers"),
-            ],
-            [InlineKeyboardButton(text="🛒 Beli Langganan", callback_data="pay:buy")],
-            [InlineKeyboardButton(text="📜 Riwayat", callback_data="pay:history")],
-            [
-                InlineKeyboardButton(text="➕ Grant", callback_data="subs:grant"),
-                InlineKeyboardButton(text="✕ Revoke", callback_data="subs:revoke"),
-            ],
-            [InlineKeyboardButton(text="📃 Active Subs", callback_data="subs:list")],
-            [InlineKeyboardButton(text="← Kembali", callback_data="menu:home")],
+            nav,
+            [_BACK_SUBS],
         ]
     )
 
 
+_GRANT_TIER_KB = _Markup(
+    inline_keyboard=[
+        [
+            _Btn(text="⭐ Basic", callback_data="subs:grant:basic"),
+            _Btn(text="💎 Premium", callback_data="subs:grant:premium"),
+        ],
+        [_CANCEL_SUBS],
+    ]
+)
+
+
 def grant_tier_keyboard() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
-        inline_keyboard=[
-            [
-                InlineKeyboardButton(text="⭐ Basic", callback_data="subs:grant:basic"),
-                InlineKeyboardButton(text="💎 Premium", callback_data="subs:grant:premium"),
-            ],
-            [InlineKeyboardButton(text="✕ Batal", callback_data="menu:subs")],
-        ]
-    )
+    return _GRANT_TIER_KB
 
 
+@lru_cache(maxsize=512)
 def grant_duration_keyboard(tier: str) -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
+    return _Markup(
         inline_keyboard=[
             [
-                InlineKeyboardButton(text="1 Hari", callback_data=f"subs:dur:{tier}:daily"),
-                InlineKeyboardButton(text="7 Hari", callback_data=f"subs:dur:{tier}:weekly"),
+                _Btn(text="1 Hari", callback_data=f"subs:dur:{tier}:daily"),
+                _Btn(text="7 Hari", callback_data=f"subs:dur:{tier}:weekly"),
             ],
-            [InlineKeyboardButton(text="30 Hari", callback_data=f"subs:dur:{tier}:monthly")],
-            [InlineKeyboardButton(text="✕ Batal", callback_data="menu:subs")],
+            [_Btn(text="30 Hari", callback_data=f"subs:dur:{tier}:monthly")],
+            [_CANCEL_SUBS],
         ]
     )
 
@@ -347,136 +440,163 @@ def grant_duration_keyboard(tier: str) -> InlineKeyboardMarkup:
 # Payment keyboards
 # ---------------------------------------------------------------------------
 
+_PAY_TIER_KB = _Markup(
+    inline_keyboard=[
+        [
+            _Btn(text="⭐ Basic", callback_data=PayCB(action="tier", tier="basic").pack()),
+            _Btn(text="💎 Premium", callback_data=PayCB(action="tier", tier="premium").pack()),
+        ],
+        [_BACK_SUBS],
+    ]
+)
+
+
 def pay_tier_keyboard() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
-        inline_keyboard=[
-            [
-                InlineKeyboardButton(text="⭐ Basic", callback_data="pay:tier:basic"),
-                InlineKeyboardButton(text="💎 Premium", callback_data="pay:tier:premium"),
-            ],
-            [InlineKeyboardButton(text="← Kembali", callback_data="menu:subs")],
-        ]
-    )
+    return _PAY_TIER_KB
 
 
 def pay_duration_keyboard(tier: str, prices: dict) -> InlineKeyboardMarkup:
-    rows = []
-    for dur_key, label in [("daily", "1 Hari"), ("weekly", "7 Hari"), ("monthly", "30 Hari")]:
-        price = prices.get(f"{tier}_{dur_key}", 0)
-        rows.append([
-            InlineKeyboardButton(
-                text=f"{label} · Rp {price:,}".replace(",", "."),
-                callback_data=f"pay:dur:{tier}:{dur_key}",
+    return _pay_duration_keyboard(tier, tuple(sorted(prices.items())))
+
+
+@lru_cache(maxsize=64)
+def _pay_duration_keyboard(tier: str, prices_items: tuple) -> InlineKeyboardMarkup:
+    prices = dict(prices_items)
+    rows = [
+        [
+            _Btn(
+                text=f"{label} · {format_rp(prices.get(f'{tier}_{dur_key}', 0))}",
+                callback_data=PayCB(action="dur", tier=tier, duration=dur_key).pack(),
             )
-        ])
-    rows.append([InlineKeyboardButton(text="← Kembali", callback_data="pay:buy")])
-    return InlineKeyboardMarkup(inline_keyboard=rows)
+        ]
+        for dur_key, label in (("daily", "1 Hari"), ("weekly", "7 Hari"), ("monthly", "30 Hari"))
+    ]
+    rows.append([_BACK_PAY_BUY])
+    return _Markup(inline_keyboard=rows)
 
 
+@lru_cache(maxsize=512)
 def pay_confirm_keyboard(tier: str, duration: str, amount: int) -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
+    return _Markup(
         inline_keyboard=[
-            [InlineKeyboardButton(
-                text=f"Bayar Rp {amount:,}".replace(",", "."),
-                callback_data=f"pay:confirm:{tier}:{duration}",
+            [_Btn(
+                text=f"Bayar {format_rp(amount)}",
+                callback_data=PayCB(action="confirm", tier=tier, duration=duration).pack(),
             )],
-            [InlineKeyboardButton(text="← Kembali", callback_data="pay:buy")],
+            [_BACK_PAY_BUY],
         ]
     )
 
 
 def pay_waiting_keyboard(transaction_id: str) -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
+    return _Markup(
         inline_keyboard=[
-            [InlineKeyboardButton(text="↻ Cek Pembayaran", callback_data=f"pay:check:{transaction_id}")],
-            [InlineKeyboardButton(text="✕ Batalkan", callback_data=f"pay:cancel:{transaction_id}")],
+            [_Btn(
+                text="↻ Cek Pembayaran",
+                callback_data=PayCB(action="check", txn_id=transaction_id).pack(),
+            )],
+            [_Btn(
+                text="✕ Batalkan",
+                callback_data=PayCB(action="cancel", txn_id=transaction_id).pack(),
+            )],
         ]
     )
 
 
+_PAY_BACK_KB = _Markup(
+    inline_keyboard=[
+        [_BACK_SUBS],
+    ]
+)
+
+
 def pay_back_keyboard() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
-        inline_keyboard=[
-            [InlineKeyboardButton(text="← Kembali", callback_data="menu:subs")],
-        ]
-    )
+    return _PAY_BACK_KB
 
 
 # ---------------------------------------------------------------------------
 # Admin user management keyboards
 # ---------------------------------------------------------------------------
 
+@lru_cache(maxsize=512)
 def admin_users_keyboard(page: int, total_pages: int) -> InlineKeyboardMarkup:
     nav = []
     if page > 0:
-        nav.append(InlineKeyboardButton(text="◂ Prev", callback_data=f"adm:users:p:{page - 1}"))
-    nav.append(InlineKeyboardButton(text=f"{page + 1}/{total_pages}", callback_data="noop"))
+        nav.append(_Btn(text="◂ Prev", callback_data=f"adm:users:p:{page - 1}"))
+    nav.append(_Btn(text=f"{page + 1}/{total_pages}", callback_data="noop"))
     if page < total_pages - 1:
-        nav.append(InlineKeyboardButton(text="Next ▸", callback_data=f"adm:users:p:{page + 1}"))
+        nav.append(_Btn(text="Next ▸", callback_data=f"adm:users:p:{page + 1}"))
 
     rows = []
     if nav:
         rows.append(nav)
-    rows.append([InlineKeyboardButton(text="🔍 Cari User", callback_data="adm:user:search")])
-    rows.append([InlineKeyboardButton(text="← Admin", callback_data="menu:admin")])
-    return InlineKeyboardMarkup(inline_keyboard=rows)
+    rows.append([_Btn(text="🔍 Cari User", callback_data="adm:user:search")])
+    rows.append([_BACK_ADMIN])
+    return _Markup(inline_keyboard=rows)
 
 
+@lru_cache(maxsize=512)
 def admin_user_detail_keyboard(user_id: int) -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
+    return _Markup(
         inline_keyboard=[
             [
-                InlineKeyboardButton(text="➕ Grant Sub", callback_data=f"adm:usub:grant:{user_id}"),
-                InlineKeyboardButton(text="✕ Revoke", callback_data=f"adm:usub:revoke:{user_id}"),
+                _Btn(text="➕ Grant Sub", callback_data=f"adm:usub:grant:{user_id}"),
+                _Btn(text="✕ Revoke", callback_data=f"adm:usub:revoke:{user_id}"),
             ],
-            [InlineKeyboardButton(text="✕ Hapus User", callback_data=f"adm:user:del:{user_id}")],
-            [InlineKeyboardButton(text="← Users", callback_data="adm:users")],
+            [_Btn(text="✕ Hapus User", callback_data=f"adm:user:del:{user_id}")],
+            [_Btn(text="← Users", callback_data="adm:users")],
         ]
     )
 
 
+@lru_cache(maxsize=512)
 def admin_user_del_confirm_keyboard(user_id: int) -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
+    return _Markup(
         inline_keyboard=[
             [
-                InlineKeyboardButton(text="Ya, Hapus", callback_data=f"adm:user:delok:{user_id}"),
-                InlineKeyboardButton(text="Batal", callback_data=f"adm:user:view:{user_id}"),
+                _Btn(text="Ya, Hapus", callback_data=f"adm:user:delok:{user_id}"),
+                _Btn(text="Batal", callback_data=f"adm:user:view:{user_id}"),
             ],
         ]
     )
 
 
+_BROADCAST_CONFIRM_KB = _Markup(
+    inline_keyboard=[
+        [
+            _Btn(text="Kirim", callback_data="adm:bc:send"),
+            _Btn(text="Batal", callback_data="menu:admin"),
+        ],
+    ]
+)
+
+
 def broadcast_confirm_keyboard() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
-        inline_keyboard=[
-            [
-                InlineKeyboardButton(text="Kirim", callback_data="adm:bc:send"),
-                InlineKeyboardButton(text="Batal", callback_data="menu:admin"),
-            ],
-        ]
-    )
+    return _BROADCAST_CONFIRM_KB
 
 
+@lru_cache(maxsize=512)
 def admin_assign_tier_keyboard(user_id: int) -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
+    return _Markup(
         inline_keyboard=[
             [
-                InlineKeyboardButton(text="⭐ Basic", callback_data=f"adm:usub:t:{user_id}:basic"),
-                InlineKeyboardButton(text="💎 Premium", callback_data=f"adm:usub:t:{user_id}:premium"),
+                _Btn(text="⭐ Basic", callback_data=f"adm:usub:t:{user_id}:basic"),
+                _Btn(text="💎 Premium", callback_data=f"adm:usub:t:{user_id}:premium"),
             ],
-            [InlineKeyboardButton(text="✕ Batal", callback_data=f"adm:user:view:{user_id}")],
+            [_Btn(text="✕ Batal", callback_data=f"adm:user:view:{user_id}")],
         ]
     )
 
 
+@lru_cache(maxsize=512)
 def admin_assign_dur_keyboard(user_id: int, tier: str) -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
+    return _Markup(
         inline_keyboard=[
             [
-                InlineKeyboardButton(text="1 Hari", callback_data=f"adm:usub:d:{user_id}:{tier}:daily"),
-                InlineKeyboardButton(text="7 Hari", callback_data=f"adm:usub:d:{user_id}:{tier}:weekly"),
+                _Btn(text="1 Hari", callback_data=f"adm:usub:d:{user_id}:{tier}:daily"),
+                _Btn(text="7 Hari", callback_data=f"adm:usub:d:{user_id}:{tier}:weekly"),
             ],
-            [InlineKeyboardButton(text="30 Hari", callback_data=f"adm:usub:d:{user_id}:{tier}:monthly")],
-            [InlineKeyboardButton(text="✕ Batal", callback_data=f"adm:user:view:{user_id}")],
+            [_Btn(text="30 Hari", callback_data=f"adm:usub:d:{user_id}:{tier}:monthly")],
+            [_Btn(text="✕ Batal", callback_data=f"adm:user:view:{user_id}")],
         ]
     )
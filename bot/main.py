@@ -6,11 +6,18 @@ from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.types import ErrorEvent
 
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
 from .config import settings
 from .handlers import get_routers
+from .handlers.gemini import gemini_mgr
 from . import database as db
 from .cleanup_scheduler import midnight_cleaner
 from .gemini_health_scheduler import gemini_health_scheduler
+from .payment_reaper import payment_reaper
 
 logger = logging.getLogger(__name__)
 
@@ -61,12 +68,15 @@ async def main() -> None:
     midnight_cleaner.start(bot=bot, admin_ids=settings.admin_ids)
 
     # --- Start Gemini health check scheduler ---
-    from .handlers.gemini import gemini_mgr
     gemini_health_scheduler.start(bot=bot, admin_ids=settings.admin_ids, gemini_mgr=gemini_mgr)
 
+    # --- Start QRIS payment/topup poller ---
+    payment_reaper.start(bot=bot)
+
     try:
         await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
     finally:
+        payment_reaper.stop()
         gemini_health_scheduler.stop()
         midnight_cleaner.stop()
         await db.close_db()
@@ -74,4 +84,7 @@ async def main() -> None:
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if uvloop is not None:
+        uvloop.run(main())
+    else:
+        asyncio.run(main())
@@ -0,0 +1,42 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, TelegramObject
+
+from .security import is_admin
+
+
+class AdminFlagMiddleware(BaseMiddleware):
+    """Resolve the admin check once per update and pass it as ``is_admin``."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        data["is_admin"] = is_admin(user.id if user else 0)
+        return await handler(event, data)
+
+
+class UserIdMiddleware(BaseMiddleware):
+    """Pass the sender's id as ``user_id``; events without a user are dropped.
+
+    Keeps anonymous updates (channel posts, anonymous admins) from reaching
+    quota and cooldown bookkeeping under a shared ``user_id=0``.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is None:
+            if isinstance(event, CallbackQuery):
+                await event.answer()
+            return None
+        data["user_id"] = user.id
+        return await handler(event, data)
@@ -7,16 +7,33 @@ Methods:
   list_transactions(status, limit, offset)           → dict
 """
 
+import json
 import logging
 from typing import Any, Dict, Optional
 
 import aiohttp
+from yarl import URL
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
 
 from .config import settings
 
 logger = logging.getLogger(__name__)
 
-_BASE = settings.QRIS_BASE_URL.rstrip("/")
+_BASE = URL(settings.QRIS_BASE_URL.rstrip("/"))
+_URL_CREATE = _BASE / "create-transaction"
+_URL_STATUS = _BASE / "check-status"
+_URL_LIST = _BASE / "transactions"
+
+# Everything goes to one host; keep its connections warm between polls.
+_CONN_LIMIT = 50
+_CONN_LIMIT_PER_HOST = 20
+_KEEPALIVE_TIMEOUT = 75
+_DNS_CACHE_TTL = 300
 
 
 class QRISClient:
@@ -24,17 +41,29 @@ class QRISClient:
 
     def __init__(self) -> None:
         self._session: Optional[aiohttp.ClientSession] = None
+        self._headers_key: Optional[str] = None
+        self._headers_cached: Dict[str, str] = {}
 
     def _headers(self) -> Dict[str, str]:
-        return {
-            "Authorization": f"Bearer {settings.QRIS_API_KEY}",
-            "Content-Type": "application/json",
-        }
+        # Rebuilt only if the API key in settings has been swapped.
+        if self._headers_key != settings.QRIS_API_KEY:
+            self._headers_key = settings.QRIS_API_KEY
+            self._headers_cached = {
+                "Authorization": f"Bearer {settings.QRIS_API_KEY}",
+                "Content-Type": "application/json",
+            }
+        return self._headers_cached
 
     async def _get_session(self) -> aiohttp.ClientSession:
         if self._session is None or self._session.closed:
             self._session = aiohttp.ClientSession(
                 timeout=aiohttp.ClientTimeout(total=30),
+                connector=aiohttp.TCPConnector(
+                    limit=_CONN_LIMIT,
+                    limit_per_host=_CONN_LIMIT_PER_HOST,
+                    keepalive_timeout=_KEEPALIVE_TIMEOUT,
+                    ttl_dns_cache=_DNS_CACHE_TTL,
+                ),
             )
         return self._session
 
@@ -66,11 +95,11 @@ class QRISClient:
 
         session = await self._get_session()
         async with session.post(
-            f"{_BASE}/create-transaction",
+            _URL_CREATE,
             json=payload,
             headers=self._headers(),
         ) as resp:
-            data = await resp.json()
+            data = await resp.json(loads=_json_loads)
             logger.info(
                 "[QRIS] create_transaction amount=%s → status=%s tid=%s",
                 amount,
@@ -94,7 +123,7 @@ class QRISClient:
         """
         session = await self._get_session()
         async with session.get(
-            f"{_BASE}/check-status/{transaction_id}",
+            _URL_STATUS / transaction_id,
             headers=self._headers(),
         ) as resp:
             content_type = resp.headers.get("Content-Type", "")
@@ -108,7 +137,7 @@ class QRISClient:
                 raise RuntimeError(
                     f"QRIS returned non-JSON ({content_type}): {body[:200]}"
                 )
-            data = await resp.json()
+            data = await resp.json(loads=_json_loads)
             return data
 
     # ------------------------------------------------------------------
@@ -125,11 +154,11 @@ class QRISClient:
             params["status"] = status
         session = await self._get_session()
         async with session.get(
-            f"{_BASE}/transactions",
+            _URL_LIST,
             headers=self._headers(),
             params=params,
         ) as resp:
-            return await resp.json()
+            return await resp.json(loads=_json_loads)
 
 
 # ---------------------------------------------------------------------------
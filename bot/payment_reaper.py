@@ -0,0 +1,215 @@
+"""
+Single background poller for pending QRIS transactions.
+
+Subscription purchases and quota topups both register their transaction
+here instead of spawning a task each. Every tick the reaper checks all
+due transactions concurrently (bounded), backing off per transaction
+while nothing changes, and hands paid ones to the caller's grant
+coroutine.
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+from aiogram import Bot
+from aiogram.types import InlineKeyboardMarkup
+
+from . import database as db
+from .config import settings
+from .payment_client import qris_client
+
+logger = logging.getLogger(__name__)
+
+# Poll back-off: each quiet interval grows by this factor, up to the cap.
+POLL_BACKOFF = 1.5
+POLL_MAX_DELAY = 30
+
+# Max check-status requests in flight per tick; matches the QRIS client's
+# per-host connection limit so a full tick can use the whole pool.
+CHECK_CONCURRENCY = 20
+
+
+@dataclass
+class PendingPayment:
+    chat_id: int
+    qr_message_id: Optional[int]
+    on_paid: Callable[[], Awaitable[None]]
+    expired_text: str
+    timeout_text: str
+    reply_markup: Optional[InlineKeyboardMarkup]
+    deadline: float                  # monotonic
+    next_check: float                # monotonic
+    delay: float
+    status: Optional[str] = None     # set when this process finalized the DB record
+
+
+class PaymentReaper:
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._bot: Optional[Bot] = None
+        self._pending: Dict[str, PendingPayment] = {}
+        self._wakeup = asyncio.Event()
+        self._check_sem = asyncio.Semaphore(CHECK_CONCURRENCY)
+        # Grants and notices run outside the tick so a slow send can't stall
+        # polling; strong refs keep them from being garbage-collected.
+        self._followups: Set[asyncio.Task] = set()
+
+    def start(self, bot: Bot) -> None:
+        self._bot = bot
+        self._task = asyncio.create_task(self._loop(), name="qris-payment-reaper")
+        logger.info("[PaymentReaper] Started")
+
+    def stop(self) -> None:
+        if self._task and not self._task.done():
+            self._task.cancel()
+        logger.info("[PaymentReaper] Stopped (%d pending dropped)", len(self._pending))
+
+    def is_full(self) -> bool:
+        return len(self._pending) >= settings.MAX_CONCURRENT_POLLS
+
+    def add(
+        self,
+        transaction_id: str,
+        chat_id: int,
+        on_paid: Callable[[], Awaitable[None]],
+        expired_text: str,
+        timeout_text: str,
+        reply_markup: Optional[InlineKeyboardMarkup] = None,
+        qr_message_id: Optional[int] = None,
+    ) -> None:
+        now = time.monotonic()
+        interval = settings.QRIS_POLL_INTERVAL
+        deadline = now + settings.QRIS_POLL_TIMEOUT
+        self._pending[transaction_id] = PendingPayment(
+            chat_id=chat_id,
+            qr_message_id=qr_message_id,
+            on_paid=on_paid,
+            expired_text=expired_text,
+            timeout_text=timeout_text,
+            reply_markup=reply_markup,
+            deadline=deadline,
+            next_check=min(now + interval, deadline),
+            delay=interval,
+        )
+        self._wakeup.set()
+
+    def notify(self, transaction_id: str, status: Optional[str] = None) -> None:
+        """Check this transaction on the next tick instead of waiting.
+
+        User activity also resets the back-off to the base interval.
+        Pass ``status`` when the DB record itself was just finalized.
+        """
+        pending = self._pending.get(transaction_id)
+        if pending is None:
+            return
+        if status is not None:
+            pending.status = status
+        pending.delay = settings.QRIS_POLL_INTERVAL
+        pending.next_check = 0
+        self._wakeup.set()
+
+    # ------------------------------------------------------------------
+    # Loop
+    # ------------------------------------------------------------------
+
+    async def _loop(self) -> None:
+        while True:
+            self._wakeup.clear()
+            now = time.monotonic()
+            due = [txn_id for txn_id, p in self._pending.items() if p.next_check <= now]
+            if due:
+                await asyncio.gather(*(self._check(txn_id) for txn_id in due))
+                continue
+
+            wake_at = min((p.next_check for p in self._pending.values()), default=None)
+            timeout = None if wake_at is None else max(wake_at - now, 0)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _check(self, transaction_id: str) -> None:
+        p = self._pending[transaction_id]
+        try:
+            done = await self._poll_once(transaction_id, p)
+        except Exception:
+            logger.exception("[PaymentReaper] Check failed for %s", transaction_id)
+            done = False
+        if done:
+            self._pending.pop(transaction_id, None)
+        elif p.next_check <= time.monotonic():
+            p.next_check = time.monotonic() + p.delay
+
+    async def _poll_once(self, transaction_id: str, p: PendingPayment) -> bool:
+        """Check one transaction. Returns True once it needs no further polling."""
+        if p.status is not None and p.status != "pending":
+            return True
+
+        now = time.monotonic()
+        if now >= p.deadline:
+            await db.mark_payment_expired(transaction_id)
+            self._spawn(self._finish(p, p.timeout_text))
+            return True
+
+        p.next_check = min(now + p.delay, p.deadline)
+        p.delay = min(p.delay * POLL_BACKOFF, max(POLL_MAX_DELAY, settings.QRIS_POLL_INTERVAL))
+
+        # A webhook grant (handled by the gateway process) shows up here as
+        # "paid"; mark_payment_paid only flips pending rows, so it is a no-op.
+        try:
+            async with self._check_sem:
+                result = await qris_client.check_status(transaction_id)
+            status = result.get("transaction", {}).get("status", "pending")
+        except Exception as e:
+            logger.warning("[PaymentReaper] Poll error for %s: %s", transaction_id, e)
+            return False
+
+        if status == "paid":
+            self._spawn(self._grant(transaction_id, p))
+            return True
+
+        if status == "expired":
+            await db.mark_payment_expired(transaction_id)
+            self._spawn(self._finish(p, p.expired_text))
+            return True
+
+        return False
+
+    def _spawn(self, coro: Awaitable[None]) -> None:
+        task = asyncio.create_task(coro)
+        self._followups.add(task)
+        task.add_done_callback(self._followups.discard)
+
+    async def _grant(self, transaction_id: str, p: PendingPayment) -> None:
+        await self._delete_qr_message(p)
+        try:
+            await p.on_paid()
+        except Exception:
+            logger.exception("[PaymentReaper] Grant failed for %s", transaction_id)
+
+    async def _finish(self, p: PendingPayment, text: str) -> None:
+        await self._delete_qr_message(p)
+        try:
+            await self._bot.send_message(
+                chat_id=p.chat_id,
+                text=text,
+                reply_markup=p.reply_markup,
+            )
+        except Exception:
+            pass
+
+    async def _delete_qr_message(self, p: PendingPayment) -> None:
+        """Delete the QR image message silently."""
+        if not p.qr_message_id:
+            return
+        try:
+            await self._bot.delete_message(chat_id=p.chat_id, message_id=p.qr_message_id)
+        except Exception:
+            pass
+
+
+# Singleton
+payment_reaper = PaymentReaper()
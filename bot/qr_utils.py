@@ -1,23 +1,34 @@
 """Generate QR code PNG bytes from QRIS content string."""
 
 import io
+import threading
+from functools import lru_cache
+
 import qrcode
 
+# One encoder for the process; handlers run it from worker threads.
+_QR = qrcode.QRCode(
+    error_correction=qrcode.constants.ERROR_CORRECT_M,
+    box_size=10,
+    border=4,
+)
+_QR_LOCK = threading.Lock()
+
 
+@lru_cache(maxsize=256)
 def generate_qr_png(data: str) -> bytes:
     """Generate a QR code PNG image from raw QRIS content string.
 
-    Returns PNG bytes ready to send via Telegram.
+    Returns PNG bytes ready to send via Telegram. Results are cached by
+    content, so a retried transaction does not re-encode the same QR.
+    CPU-bound — call it through ``asyncio.to_thread`` from handlers.
     """
-    qr = qrcode.QRCode(
-        version=None,  # auto-size
-        error_correction=qrcode.constants.ERROR_CORRECT_M,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(data)
-    qr.make(fit=True)
-    img = qr.make_image(fill_color="black", back_color="white")
+    with _QR_LOCK:
+        _QR.clear()
+        _QR.version = None  # auto-size; make() would otherwise start from the last version
+        _QR.add_data(data)
+        _QR.make(fit=True)
+        img = _QR.make_image(fill_color="black", back_color="white")
     buf = io.BytesIO()
     img.save(buf, format="PNG")
     return buf.getvalue()
@@ -21,8 +21,13 @@ COOLDOWNS: Dict[Tier, int] = {
     Tier.PREMIUM: 5,
 }
 
-# {user_id: last_generation_timestamp}
+# Entries older than the longest cooldown can never block again.
+_MAX_COOLDOWN = max(COOLDOWNS.values())
+_SWEEP_AT = 10_000
+
+# {user_id: time.monotonic() of last generation}
 _last_request: Dict[int, float] = {}
+_next_sweep = _SWEEP_AT
 
 
 def check_cooldown(user_id: int, tier: Tier, is_admin: bool = False) -> Tuple[bool, int]:
@@ -40,10 +45,11 @@ def check_cooldown(user_id: int, tier: Tier, is_admin: bool = False) -> Tuple[bo
     if cooldown <= 0:
         return True, 0
 
-    now = time.time()
-    last = _last_request.get(user_id, 0)
-    elapsed = now - last
+    last = _last_request.get(user_id)
+    if last is None:
+        return True, 0
 
+    elapsed = time.monotonic() - last
     if elapsed >= cooldown:
         return True, 0
 
@@ -53,7 +59,14 @@ def check_cooldown(user_id: int, tier: Tier, is_admin: bool = False) -> Tuple[bo
 
 def record_request(user_id: int) -> None:
     """Record that the user just made a generation request."""
-    _last_request[user_id] = time.time()
+    global _last_request, _next_sweep
+    now = time.monotonic()
+    if len(_last_request) >= _next_sweep:
+        cutoff = now - _MAX_COOLDOWN
+        _last_request = {k: v for k, v in _last_request.items() if v > cutoff}
+        # if most users are still cooling down, don't rescan on every call
+        _next_sweep = max(_SWEEP_AT, 2 * len(_last_request))
+    _last_request[user_id] = now
 
 
 def get_cooldown_text(tier: Tier) -> str:
@@ -1,8 +1,12 @@
+from typing import FrozenSet
+
 from .config import settings
 
+# Parsed once; BOT_ADMIN_IDS only changes on restart.
+_ADMIN_IDS: FrozenSet[int] = frozenset(settings.admin_ids)
+
 
 def is_admin(user_id: int) -> bool:
-    admins = settings.admin_ids
-    if not admins:
+    if not _ADMIN_IDS:
         return True
-    return user_id in admins
+    return user_id in _ADMIN_IDS
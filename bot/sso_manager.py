@@ -1,28 +1,49 @@
+import os
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Tuple
+
+# remove_last_key reads this much from the end of the file to find the last key.
+_TAIL_BYTES = 4096
 
 
 class LocalSSOManager:
     def __init__(self, file_path: Path):
         self.file_path = file_path
+        # Parsed keys, valid while the file's (mtime_ns, size) is unchanged.
+        self._cache: List[str] = []
+        self._cache_sig: Optional[Tuple[int, int]] = None
 
     def _ensure_file(self) -> None:
         if not self.file_path.exists():
             self.file_path.parent.mkdir(parents=True, exist_ok=True)
             self.file_path.write_text("", encoding="utf-8")
 
+    def _stat_sig(self) -> Tuple[int, int]:
+        try:
+            st = self.file_path.stat()
+        except FileNotFoundError:
+            self._ensure_file()
+            st = self.file_path.stat()
+        return st.st_mtime_ns, st.st_size
+
+    def _keys(self) -> List[str]:
+        """Cached key list; re-read only when the file changed on disk."""
+        sig = self._stat_sig()
+        if sig != self._cache_sig:
+            lines = self.file_path.read_text(encoding="utf-8").splitlines()
+            self._cache = [line.strip() for line in lines if line.strip()]
+            self._cache_sig = sig
+        return self._cache
+
     def list_keys(self) -> List[str]:
-        self._ensure_file()
-        lines = self.file_path.read_text(encoding="utf-8").splitlines()
-        keys = [line.strip() for line in lines if line.strip()]
-        return keys
+        return list(self._keys())
 
     def add_key(self, key: str) -> Dict[str, Any]:
         key = key.strip()
         if not key:
             return {"status": "error", "message": "Key kosong"}
 
-        keys = self.list_keys()
+        keys = self._keys()
         before_count = len(keys)
         if key in keys:
             return {
@@ -34,6 +55,8 @@ class LocalSSOManager:
 
         with self.file_path.open("a", encoding="utf-8") as f:
             f.write(key + "\n")
+        keys.append(key)
+        self._cache_sig = self._stat_sig()
 
         return {
             "status": "ok",
@@ -42,22 +65,48 @@ class LocalSSOManager:
             "after_count": before_count + 1,
         }
 
+    def _truncate_last_line(self) -> bool:
+        """Cut the last non-blank line off the file in place.
+
+        Returns False, leaving the file untouched, if that line does not fit
+        in the tail buffer.
+        """
+        with self.file_path.open("rb+") as f:
+            size = f.seek(0, 2)
+            tail_size = min(size, _TAIL_BYTES)
+            f.seek(size - tail_size)
+            tail = f.read(tail_size)
+
+            end = len(tail.rstrip())
+            start = tail.rfind(b"\n", 0, end) + 1
+            if end == 0 or (start == 0 and tail_size < size):
+                return False
+
+            f.truncate(size - tail_size + start)
+        return True
+
     def remove_last_key(self) -> Dict[str, str]:
-        keys = self.list_keys()
+        keys = self._keys()
         if not keys:
             return {"status": "error", "message": "Tidak ada key untuk dihapus"}
 
-        removed = keys.pop()
-        content = "\n".join(keys)
-        if content:
-            content += "\n"
-        self.file_path.write_text(content, encoding="utf-8")
+        removed, keys = keys[-1], keys[:-1]
+        if not self._truncate_last_line():
+            content = "\n".join(keys)
+            if content:
+                content += "\n"
+            # temp file + rename: a crash mid-write can't lose every key
+            tmp = self.file_path.with_name(self.file_path.name + ".tmp")
+            tmp.write_text(content, encoding="utf-8")
+            os.replace(tmp, self.file_path)
+        self._cache = keys
+        self._cache_sig = self._stat_sig()
 
         preview = removed[:6] + "..." + removed[-4:] if len(removed) > 12 else removed[:3] + "***"
         return {"status": "ok", "message": f"Key terakhir dihapus ({preview})"}
 
     def get_masked_summary(self) -> List[str]:
-        keys = self.list_keys()
+        keys = self._keys()
         result = []
         for idx, value in enumerate(keys, start=1):
             if len(value) <= 12:
@@ -14,8 +14,9 @@ Storage: SQLite via bot.database
 
 import time
 from dataclasses import dataclass
+from datetime import datetime
 from enum import Enum
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Tuple
 
 from . import database as db
 
@@ -30,6 +31,10 @@ class Tier(str, Enum):
     PREMIUM = "premium"
 
 
+# Raw values accepted by Tier(); check membership before constructing.
+TIER_VALUES = frozenset(t.value for t in Tier)
+
+
 class Duration(str, Enum):
     DAILY = "daily"      # 1 day
     WEEKLY = "weekly"    # 7 days
@@ -48,12 +53,17 @@ TIER_LABELS = {
     Tier.PREMIUM: "💎 Premium",
 }
 
+# Same labels keyed by the raw string stored in the DB (no Enum coercion).
+TIER_LABELS_BY_VALUE = {t.value: label for t, label in TIER_LABELS.items()}
+
 DURATION_LABELS = {
     Duration.DAILY: "Harian (1 hari)",
     Duration.WEEKLY: "Mingguan (7 hari)",
     Duration.MONTHLY: "Bulanan (30 hari)",
 }
 
+DURATION_LABELS_BY_VALUE = {d.value: label for d, label in DURATION_LABELS.items()}
+
 
 # ---------------------------------------------------------------------------
 # Tier limits
@@ -116,24 +126,95 @@ class Subscription:
 # Subscription Manager (SQLite-backed)
 # ---------------------------------------------------------------------------
 
+# How long a rendered get_info_text() result is reused (menu refresh spam).
+INFO_TEXT_TTL = 5.0
+
+# How long get_tier() trusts its last lookup; grant()/revoke() invalidate.
+TIER_CACHE_TTL = 60.0
+
+# How long get_subscription() reuses a row (menu and status renders).
+SUBSCRIPTION_CACHE_TTL = 5.0
+
+
+def _limits_text(tier: Tier) -> str:
+    limits = TIER_LIMITS[tier]
+    img_txt = "∞" if limits.is_unlimited_images else f"{limits.images_per_day}/hari"
+    vid_txt = "∞" if limits.is_unlimited_videos else f"{limits.videos_per_day}/hari"
+    text = (
+        f"\nKuota harian: Img <b>{img_txt}</b> · Vid <b>{vid_txt}</b>\n"
+        f"Max <b>{limits.max_images_per_request}</b> gambar/permintaan · Batch <b>{limits.max_batch_prompts}</b>"
+    )
+    if tier == Tier.FREE:
+        text += "\n\n<i>Upgrade ke Basic/Premium untuk kuota lebih besar.</i>"
+    return text
+
+
+# get_info_text() skeleton; only the tier label and expiry status vary per user.
+_INFO_TEMPLATE = (
+    "<b>💎 Langganan</b>\n"
+    "<i>Paket langganan menentukan kuota harianmu</i>\n\n"
+    "Tier kamu: <b>{tier}</b>{status}\n"
+    "{limits}"
+)
+_INFO_LIMITS_TEXT = {tier: _limits_text(tier) for tier in Tier}
+
+
 class SubscriptionManager:
 
+    def __init__(self):
+        # user_id → (monotonic expiry, rendered info text)
+        self._info_cache: Dict[int, Tuple[float, str]] = {}
+        # user_id → (monotonic expiry, tier)
+        self._tier_cache: Dict[int, Tuple[float, Tier]] = {}
+        # user_id → (monotonic expiry, subscription)
+        self._sub_cache: Dict[int, Tuple[float, Subscription]] = {}
+
     async def get_subscription(self, user_id: int) -> Subscription:
+        now = time.monotonic()
+        cached = self._sub_cache.get(user_id)
+        if cached is not None and cached[0] > now and not self._expired(cached[1]):
+            return cached[1]
+
+        sub = await self._load_subscription(user_id)
+        if len(self._sub_cache) >= 10_000:
+            self._sub_cache = {k: v for k, v in self._sub_cache.items() if v[0] > now}
+        self._sub_cache[user_id] = (now + SUBSCRIPTION_CACHE_TTL, sub)
+        return sub
+
+    @staticmethod
+    def _expired(sub: Subscription) -> bool:
+        return sub.expires > 0 and time.time() > sub.expires
+
+    async def _load_subscription(self, user_id: int) -> Subscription:
         row = await db.get_subscription(user_id)
         if row is None:
             return Subscription(tier=Tier.FREE.value, expires=0, granted_by=0, granted_at=0)
-        # check expiry
-        if row["expires"] > 0 and time.time() > row["expires"]:
-            await db.delete_subscription(user_id)
+        sub = Subscription(**row)
+        if self._expired(sub):
+            # the row itself is removed by the cleanup scheduler's expiry sweep
             return Subscription(tier=Tier.FREE.value, expires=0, granted_by=0, granted_at=0)
-        return Subscription(**row)
+        return sub
 
     async def get_tier(self, user_id: int) -> Tier:
+        now = time.monotonic()
+        cached = self._tier_cache.get(user_id)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+
         sub = await self.get_subscription(user_id)
         try:
-            return Tier(sub.tier)
+            tier = Tier(sub.tier)
         except ValueError:
-            return Tier.FREE
+            tier = Tier.FREE
+
+        ttl = TIER_CACHE_TTL
+        if sub.expires > 0:
+            # never serve a paid tier past its expiry
+            ttl = min(ttl, sub.expires - time.time())
+        if len(self._tier_cache) >= 10_000:
+            self._tier_cache = {k: v for k, v in self._tier_cache.items() if v[0] > now}
+        self._tier_cache[user_id] = (now + ttl, tier)
+        return tier
 
     async def get_limits(self, user_id: int) -> TierLimits:
         tier = await self.get_tier(user_id)
@@ -147,64 +228,63 @@ class SubscriptionManager:
         granted_by: int = 0,
     ) -> Subscription:
         now = time.time()
-
-        # extend if same tier and still active
-        existing = await db.get_subscription(user_id)
-        base_time = now
-        if existing and existing["expires"] > now and existing["tier"] == tier.value:
-            base_time = existing["expires"]
-
-        expires = base_time + DURATION_SECONDS[duration]
-        await db.upsert_subscription(
+        # extends from the current expiry if same tier and still active
+        expires = await db.grant_subscription(
             user_id=user_id,
             tier=tier.value,
-            expires=expires,
+            duration_seconds=DURATION_SECONDS[duration],
             granted_by=granted_by,
-            granted_at=now,
+            now=now,
         )
+        self.invalidate(user_id)
         return Subscription(tier=tier.value, expires=expires, granted_by=granted_by, granted_at=now)
 
     async def revoke(self, user_id: int) -> bool:
+        self.invalidate(user_id)
         return await db.delete_subscription(user_id)
 
-    async def list_active(self) -> List[Dict[str, Any]]:
-        return await db.list_active_subscriptions()
+    def invalidate(self, user_id: int) -> None:
+        """Drop cached tier/info for a user whose subscription changed elsewhere."""
+        self._info_cache.pop(user_id, None)
+        self._tier_cache.pop(user_id, None)
+        self._sub_cache.pop(user_id, None)
+
+    async def list_active(self, offset: int = 0, limit: int = 0) -> List[Dict[str, Any]]:
+        return await db.list_active_subscriptions(limit=limit, offset=offset)
+
+    async def count_active(self) -> int:
+        return await db.count_active_subscriptions()
 
     async def get_info_text(self, user_id: int) -> str:
+        now = time.monotonic()
+        cached = self._info_cache.get(user_id)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+        text = await self._render_info_text(user_id)
+        if len(self._info_cache) >= 1024:
+            self._info_cache = {k: v for k, v in self._info_cache.items() if v[0] > now}
+        self._info_cache[user_id] = (now + INFO_TEXT_TTL, text)
+        return text
+
+    async def _render_info_text(self, user_id: int) -> str:
         sub = await self.get_subscription(user_id)
-        tier = Tier(sub.tier) if sub.tier in [t.value for t in Tier] else Tier.FREE
-        limits = TIER_LIMITS[tier]
-
-        lines = [
-            "<b>💎 Langganan</b>",
-            "<i>Paket langganan menentukan kuota harianmu</i>\n",
-            f"Tier kamu: <b>{TIER_LABELS[tier]}</b>",
-        ]
+        tier = Tier(sub.tier) if sub.tier in TIER_VALUES else Tier.FREE
 
         if sub.expires > 0:
-            import datetime
-            exp_dt = datetime.datetime.fromtimestamp(sub.expires)
             remaining = sub.expires - time.time()
             if remaining > 0:
                 days = int(remaining // 86400)
                 hours = int((remaining % 86400) // 3600)
-                lines.append(f"Expires: <b>{exp_dt:%Y-%m-%d %H:%M}</b>")
-                lines.append(f"Sisa: <b>{days}h {hours}j</b>")
+                exp_dt = datetime.fromtimestamp(sub.expires)
+                status = f"\nExpires: <b>{exp_dt:%Y-%m-%d %H:%M}</b>\nSisa: <b>{days}h {hours}j</b>"
             else:
-                lines.append("Status: <b>Expired</b>")
+                status = "\nStatus: <b>Expired</b>"
+        elif tier == Tier.FREE:
+            status = "\nStatus: <b>Free (gratis, kuota terbatas)</b>"
         else:
-            if tier == Tier.FREE:
-                lines.append("Status: <b>Free (gratis, kuota terbatas)</b>")
-
-        img_txt = "∞" if limits.is_unlimited_images else f"{limits.images_per_day}/hari"
-        vid_txt = "∞" if limits.is_unlimited_videos else f"{limits.videos_per_day}/hari"
-        lines.append(f"\nKuota harian: Img <b>{img_txt}</b> · Vid <b>{vid_txt}</b>")
-        lines.append(f"Max <b>{limits.max_images_per_request}</b> gambar/permintaan · Batch <b>{limits.max_batch_prompts}</b>")
-
-        if tier == Tier.FREE:
-            lines.append("\n<i>Upgrade ke Basic/Premium untuk kuota lebih besar.</i>")
+            status = ""
 
-        return "\n".join(lines)
+        return _INFO_TEMPLATE.format(tier=TIER_LABELS[tier], status=status, limits=_INFO_LIMITS_TEXT[tier])
 
 
 # ---------------------------------------------------------------------------
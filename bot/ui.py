@@ -1,4 +1,7 @@
-from typing import Optional
+import asyncio
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from aiogram.exceptions import TelegramBadRequest
 from aiogram.fsm.context import FSMContext
@@ -7,14 +10,58 @@ from aiogram.types import InlineKeyboardMarkup, Message
 # Keys to preserve across state.clear()
 _PERSISTENT_KEYS = ("backend",)
 
+# In-process mirrors of FSM data, keyed by StorageKey; dropped on clear_state()
+_state_mirrors: List[Tuple[Dict[Any, Any], Optional[Callable[[Any], None]]]] = []
 
-async def clear_state(state: FSMContext) -> None:
-    """Clear FSM state but preserve persistent keys like backend selection."""
+# (chat_id, message_id) → (text, markup) of the last edit made through
+# safe_edit_text(), so re-sending identical content skips the round-trip.
+# Markups are compared by identity (keyboard factories are memoized); the
+# entry holds a reference, so the object can't be freed and its id reused.
+_LAST_EDIT_MAX = 10_000
+_last_edit: "OrderedDict[Tuple[int, int], Tuple[str, Optional[InlineKeyboardMarkup]]]" = OrderedDict()
+
+
+def _remember_edit(key: Tuple[int, int], text: str, reply_markup: Optional[InlineKeyboardMarkup]) -> None:
+    _last_edit[key] = (text, reply_markup)
+    _last_edit.move_to_end(key)
+    if len(_last_edit) > _LAST_EDIT_MAX:
+        _last_edit.popitem(last=False)
+
+
+def register_state_mirror(
+    mirror: Dict[Any, Any],
+    on_drop: Optional[Callable[[Any], None]] = None,
+) -> Dict[Any, Any]:
+    """Register a per-user cache of FSM data so clear_state() invalidates it.
+
+    ``on_drop`` is called with each entry clear_state() removes, for mirrors
+    whose entries own background work.
+    """
+    _state_mirrors.append((mirror, on_drop))
+    return mirror
+
+
+async def clear_state(state: FSMContext, **carry: Any) -> None:
+    """Clear FSM state but preserve persistent keys like backend selection.
+
+    Extra keyword arguments are written back together with the preserved
+    keys, for handlers that need one value to survive the reset.
+    """
+    for mirror, on_drop in _state_mirrors:
+        dropped = mirror.pop(state.key, None)
+        if dropped is not None and on_drop is not None:
+            on_drop(dropped)
     data = await state.get_data()
     preserved = {k: data[k] for k in _PERSISTENT_KEYS if k in data}
-    await state.clear()
-    if preserved:
-        await state.update_data(**preserved)
+    preserved.update(carry)
+    # set_data overwrites, so no clear() + update_data() (which re-reads)
+    await asyncio.gather(state.set_state(None), state.set_data(preserved))
+
+
+@lru_cache(maxsize=256)
+def format_rp(amount: int) -> str:
+    """Rupiah with dot thousands separators, e.g. ``Rp 25.000``."""
+    return f"Rp {amount:_}".replace("_", ".")
 
 
 async def get_backend(state: FSMContext) -> str:
@@ -30,8 +77,33 @@ async def safe_edit_text(
 ) -> None:
     if not message:
         return
+    key = (message.chat.id, message.message_id)
+    last = _last_edit.get(key)
+    if last is not None and last[0] == text and last[1] is reply_markup:
+        return
     try:
         await message.edit_text(text, reply_markup=reply_markup)
     except TelegramBadRequest as exc:
         if "message is not modified" not in str(exc).lower():
+            _last_edit.pop(key, None)
+            raise
+    _remember_edit(key, text, reply_markup)
+
+
+async def safe_edit_reply_markup(
+    message: Optional[Message],
+    reply_markup: Optional[InlineKeyboardMarkup],
+) -> None:
+    """Edit only the keyboard, for updates where the text stays the same."""
+    if not message:
+        return
+    key = (message.chat.id, message.message_id)
+    try:
+        await message.edit_reply_markup(reply_markup=reply_markup)
+    except TelegramBadRequest as exc:
+        if "message is not modified" not in str(exc).lower():
+            _last_edit.pop(key, None)
             raise
+    last = _last_edit.get(key)
+    if last is not None:
+        _remember_edit(key, last[0], reply_markup)
@@ -5,10 +5,13 @@ Uses date-keyed rows (WIB timezone) so limits auto-reset at midnight WIB.
 Supports extra quota (topup) — when daily limit is exhausted, extra quota is used.
 """
 
-from typing import Dict
+import asyncio
+import time
+from typing import Dict, Tuple
 
 from . import database as db
 from .config import settings
+from .rate_limiter import check_cooldown
 
 
 def _get_subscription_manager():
@@ -17,8 +20,20 @@ def _get_subscription_manager():
     return subscription_manager
 
 
+# How long get_status() reuses a snapshot; local quota writes invalidate it.
+STATUS_CACHE_TTL = 2.0
+
+
 class UserLimitManager:
 
+    def __init__(self):
+        # user_id → (monotonic expiry, status without "is_admin")
+        self._status_cache: Dict[int, Tuple[float, Dict[str, int]]] = {}
+
+    def invalidate(self, user_id: int) -> None:
+        """Drop the cached status for a user whose quota just changed."""
+        self._status_cache.pop(user_id, None)
+
     async def _get_limits(self, user_id: int) -> tuple[int, int]:
         """Return (image_limit, video_limit) based on subscription tier."""
         try:
@@ -29,21 +44,32 @@ class UserLimitManager:
             return settings.USER_DAILY_IMAGE_LIMIT, settings.USER_DAILY_VIDEO_LIMIT
 
     async def get_status(self, user_id: int, is_admin_user: bool = False) -> Dict[str, int | bool]:
-        usage = await db.get_usage(user_id)
-        image_limit, video_limit = await self._get_limits(user_id)
-        extra = await db.get_extra_quota(user_id)
-
-        return {
-            "is_admin": is_admin_user,
+        now = time.monotonic()
+        cached = self._status_cache.get(user_id)
+        if cached is not None and cached[0] > now:
+            return {"is_admin": is_admin_user, **cached[1]}
+
+        # tier comes from the subscription manager's cache, so this is
+        # usually a single query
+        usage, (image_limit, video_limit) = await asyncio.gather(
+            db.get_quota_snapshot(user_id),
+            self._get_limits(user_id),
+        )
+
+        status = {
             "images_used": usage["images"],
             "images_limit": image_limit,
             "images_remaining": max(0, image_limit - usage["images"]),
             "videos_used": usage["videos"],
             "videos_limit": video_limit,
             "videos_remaining": max(0, video_limit - usage["videos"]),
-            "extra_images": extra["images"],
-            "extra_videos": extra["videos"],
+            "extra_images": usage["extra_images"],
+            "extra_videos": usage["extra_videos"],
         }
+        if len(self._status_cache) >= 10_000:
+            self._status_cache = {k: v for k, v in self._status_cache.items() if v[0] > now}
+        self._status_cache[user_id] = (now + STATUS_CACHE_TTL, status)
+        return {"is_admin": is_admin_user, **status}
 
     async def can_consume(
         self,
@@ -64,41 +90,98 @@ class UserLimitManager:
 
         return (img_ok and vid_ok), status
 
-    async def consume(
+    async def preflight(
         self,
         user_id: int,
         image_units: int = 0,
         video_units: int = 0,
         is_admin_user: bool = False,
-    ) -> Dict[str, int | bool]:
-        if not is_admin_user:
-            usage = await db.get_usage(user_id)
-            image_limit, video_limit = await self._get_limits(user_id)
+    ) -> tuple[int, bool, Dict[str, int | bool]]:
+        """Cooldown and quota check in one call.
+
+        Returns (cooldown_remaining, allowed, status). While the user is in
+        cooldown the quota lookup is skipped: allowed is False and status
+        is empty.
+        """
+        tier = await _get_subscription_manager().get_tier(user_id)
+        allowed_cd, remaining_cd = check_cooldown(user_id, tier, is_admin=is_admin_user)
+        if not allowed_cd:
+            return remaining_cd, False, {}
+        allowed, status = await self.can_consume(
+            user_id,
+            image_units=image_units,
+            video_units=video_units,
+            is_admin_user=is_admin_user,
+        )
+        return 0, allowed, status
+
+    async def reserve(
+        self,
+        user_id: int,
+        image_units: int = 0,
+        video_units: int = 0,
+        is_admin_user: bool = False,
+    ) -> Dict[str, int] | None:
+        """Atomically take quota up front, daily limit first, then extra quota.
 
-            # For images: use daily limit first, overflow to extra quota
-            img_daily_remaining = max(0, image_limit - usage["images"])
-            if image_units <= img_daily_remaining:
-                await db.add_usage(user_id, images=image_units, videos=0)
+        Returns what was taken (hand it to refund() if the generation fails)
+        or None when there isn't enough quota; nothing is held in that case.
+        """
+        if is_admin_user:
+            return {}
+        image_limit, video_limit = await self._get_limits(user_id)
+        taken: Dict[str, int] = {}
+        for kind, units, limit in (
+            ("images", image_units, image_limit),
+            ("videos", video_units, video_limit),
+        ):
+            if units <= 0:
+                continue
+            if await db.try_add_usage(user_id, kind, units, limit):
+                taken[kind] = units
+            elif await db.deduct_extra_quota(user_id, **{kind: units}):
+                taken[f"extra_{kind}"] = units
             else:
-                # Use all daily remaining + deduct rest from extra
-                daily_use = min(image_units, img_daily_remaining)
-                extra_use = image_units - daily_use
-                if daily_use > 0:
-                    await db.add_usage(user_id, images=daily_use, videos=0)
-                if extra_use > 0:
-                    await db.deduct_extra_quota(user_id, images=extra_use)
-
-            # For videos: same logic
-            vid_daily_remaining = max(0, video_limit - usage["videos"])
-            if video_units <= vid_daily_remaining:
-                await db.add_usage(user_id, images=0, videos=video_units)
+                await self.refund(user_id, taken)
+                return None
+        self.invalidate(user_id)
+        return taken
+
+    async def refund(self, user_id: int, taken: Dict[str, int]) -> None:
+        """Give back quota taken by reserve()."""
+        for key, units in taken.items():
+            if key.startswith("extra_"):
+                await db.add_extra_quota(user_id, **{key.removeprefix("extra_"): units})
             else:
-                daily_use = min(video_units, vid_daily_remaining)
-                extra_use = video_units - daily_use
-                if daily_use > 0:
-                    await db.add_usage(user_id, images=0, videos=daily_use)
-                if extra_use > 0:
-                    await db.deduct_extra_quota(user_id, videos=extra_use)
+                await db.add_usage(user_id, **{key: -units})
+        self.invalidate(user_id)
+
+    async def consume(
+        self,
+        user_id: int,
+        image_units: int = 0,
+        video_units: int = 0,
+        is_admin_user: bool = False,
+    ) -> Dict[str, int | bool]:
+        if not is_admin_user:
+            usage, (image_limit, video_limit) = await asyncio.gather(
+                db.get_usage(user_id),
+                self._get_limits(user_id),
+            )
+
+            # Daily limit first, overflow to extra quota
+            daily_img = min(image_units, max(0, image_limit - usage["images"]))
+            daily_vid = min(video_units, max(0, video_limit - usage["videos"]))
+            extra_img = image_units - daily_img
+            extra_vid = video_units - daily_vid
+
+            writes = []
+            if daily_img or daily_vid:
+                writes.append(db.add_usage(user_id, images=daily_img, videos=daily_vid))
+            if extra_img or extra_vid:
+                writes.append(db.deduct_extra_quota(user_id, images=extra_img, videos=extra_vid))
+            await asyncio.gather(*writes)
+            self.invalidate(user_id)
 
         return await self.get_status(user_id, is_admin_user=is_admin_user)
 
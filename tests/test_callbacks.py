@@ -0,0 +1,24 @@
+"""PayCB must keep the callback strings used before the schema existed."""
+
+import pytest
+
+pytest.importorskip("aiogram")
+
+from bot.callbacks import PayCB  # noqa: E402
+
+
+@pytest.mark.parametrize("packed, fields", [
+    ("pay:tier:basic", {"action": "tier", "tier": "basic"}),
+    ("pay:dur:premium:30d", {"action": "dur", "tier": "premium", "duration": "30d"}),
+    ("pay:confirm:basic:7d", {"action": "confirm", "tier": "basic", "duration": "7d"}),
+    ("pay:check:TX123", {"action": "check", "txn_id": "TX123"}),
+    ("pay:cancel:TX123", {"action": "cancel", "txn_id": "TX123"}),
+])
+def test_legacy_strings_round_trip(packed, fields):
+    assert PayCB(**fields).pack() == packed
+    assert PayCB.unpack(packed) == PayCB(**fields)
+
+
+def test_padded_layout_still_unpacks():
+    assert PayCB.unpack("pay:tier:basic::") == PayCB(action="tier", tier="basic")
+    assert PayCB.unpack("pay:check:::TX123") == PayCB(action="check", txn_id="TX123")
@@ -0,0 +1,110 @@
+"""Debounced video setting toggles vs. leaving the menu (clear_state)."""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("aiogram")
+pytest.importorskip("motor")
+
+from bot.handlers import video  # noqa: E402
+from bot.ui import clear_state  # noqa: E402
+
+
+class FakeState:
+    """Minimal FSMContext stand-in backed by a dict."""
+
+    def __init__(self):
+        self.key = ("bot", 1, 1)
+        self.data = {}
+        self.state = None
+        self.updates = []
+
+    async def get_data(self):
+        await asyncio.sleep(0)  # yield like real storage, so taps can interleave
+        return dict(self.data)
+
+    async def set_data(self, data):
+        self.data = dict(data)
+
+    async def set_state(self, state=None):
+        self.state = state
+
+    async def update_data(self, data=None, **kwargs):
+        changes = {**(data or {}), **kwargs}
+        self.updates.append(changes)
+        self.data.update(changes)
+        return dict(self.data)
+
+
+class FakeCallback:
+    def __init__(self, data):
+        self.data = data
+        self.message = SimpleNamespace(chat=SimpleNamespace(id=1), message_id=10)
+
+    async def answer(self, *args, **kwargs):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def no_telegram(monkeypatch):
+    edits = []
+
+    async def fake_edit(*args, **kwargs):
+        edits.append(args)
+
+    monkeypatch.setattr(video, "safe_edit_text", fake_edit)
+    monkeypatch.setattr(video, "safe_edit_reply_markup", fake_edit)
+    video._pending_settings.clear()
+    return edits
+
+
+def test_clear_state_cancels_pending_flush(no_telegram):
+    async def scenario():
+        state = FakeState()
+        await video.set_video_setting(FakeCallback("vid:aspect:16:9"), state)
+        task = video._pending_settings[state.key].flush_task
+
+        await clear_state(state)
+        await asyncio.sleep(video.SETTINGS_DEBOUNCE * 2)
+
+        assert task.cancelled()
+        assert state.key not in video._pending_settings
+        assert state.updates == []
+        assert no_telegram == []
+
+    asyncio.run(scenario())
+
+
+def test_stale_flush_does_not_take_newer_entry(no_telegram):
+    async def scenario():
+        state = FakeState()
+        await video.set_video_setting(FakeCallback("vid:aspect:16:9"), state)
+        await clear_state(state)
+
+        # toggles made after coming back to the menu get their own flush
+        await video.set_video_setting(FakeCallback("vid:duration:10"), state)
+        newer = video._pending_settings[state.key]
+        await asyncio.sleep(video.SETTINGS_DEBOUNCE * 2)
+
+        assert newer.flush_task.done() and not newer.flush_task.cancelled()
+        assert state.updates == [{"vid_duration": 10}]
+        assert len(no_telegram) == 1
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_toggles_share_one_entry(no_telegram):
+    async def scenario():
+        state = FakeState()
+        await asyncio.gather(
+            video.set_video_setting(FakeCallback("vid:aspect:16:9"), state),
+            video.set_video_setting(FakeCallback("vid:duration:10"), state),
+        )
+        await asyncio.sleep(video.SETTINGS_DEBOUNCE * 2)
+
+        assert state.updates == [{"vid_aspect": "16:9", "vid_duration": 10}]
+        assert len(no_telegram) == 1
+
+    asyncio.run(scenario())